@@ -2,22 +2,31 @@
 # License: GPL v2
 
 import bpy
-import getpass
+import collections
+import fnmatch
+import functools
+import itertools
+import json
 import os
+import shutil
 import string
-import shelve
-import threading
+import struct
+import subprocess
+import tempfile
+import time
+import zlib
 from mathutils import Matrix, Vector
 from bpy.app.handlers import persistent
 from bl_operators.presets import AddPresetBase, ExecutePreset
 from bpy.props import BoolProperty, IntProperty, PointerProperty,\
-    StringProperty, FloatVectorProperty, EnumProperty, CollectionProperty
+    StringProperty, FloatProperty, FloatVectorProperty, EnumProperty,\
+    CollectionProperty
 
 bl_info = {
     "name": "OHA Animation Tools",
     "author": "Adhi Hargo",
     "version": (2013, 5, 6),
-    "blender": (2, 67, 0),
+    "blender": (2, 77, 0),
     "location": "F-Curve Editor > Tools",
     "description": "Various animation tools.",
     "warning": "",
@@ -31,12 +40,14 @@ def get_pbone_parent_matrix(pbone):
     parent = matrix = inv_matrix = None
     if pbone.constraints != None:
         co = [c for c in pbone.constraints
-              if c.type == 'CHILD_OF' and c.influence == 1.0]
+              if c.type == 'CHILD_OF' and c.influence == 1.0
+              and not c.mute]
         if co:
             co = co[0]                
             parent = co.target
-            matrix = parent.matrix_basis.inverted()
-            inv_matrix = co.inverse_matrix
+            if parent:
+                matrix = parent.matrix_basis.inverted()
+                inv_matrix = co.inverse_matrix
 
             if not parent:
                 parent = pbone.parent
@@ -45,11 +56,1113 @@ def get_pbone_parent_matrix(pbone):
 
     return parent, matrix, inv_matrix
 
-def bake_action(obj, frame_start, frame_end, only_selected, only_visible):
+# Work counters for the profiling records, see profile_call. Cheap
+# enough to always count.
+profile_counters = collections.Counter()
+
+def profile_count(name, n=1):
+    profile_counters[name] += n
+
+def split_patterns(text):
+    return [p.strip() for p in text.replace(',', ';').split(';')
+            if p.strip()]
+
+def scan_files(root, max_depth=2, include=('*.blend',), exclude=(),
+               min_depth=0):
+    # Walks root with os.scandir down to max_depth folder levels below
+    # it, returning matching file paths in sorted order. Files less than
+    # min_depth levels below root aren't listed. The DirEntry
+    # type info spares the isdir/isfile/access calls per entry, and
+    # unreadable folders are skipped when opening them fails. Folders
+    # reached twice through symlinks are only walked once.
+    def matches(name, patterns):
+        return any(fnmatch.fnmatch(name, p) for p in patterns)
+
+    try:
+        st = os.stat(root)
+    except OSError:
+        return []
+    visited = set([(st.st_dev, st.st_ino)])
+
+    file_list = []
+    stack = [(root, 0)]
+    while stack:
+        folder, depth = stack.pop()
+        # No context manager form, scandir iterators only have one from
+        # Python 3.6.
+        try:
+            it = os.scandir(folder)
+            entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        profile_count('folders_scanned')
+        profile_count('entries_scanned', len(entries))
+
+        subfolders = []
+        for entry in entries:
+            if matches(entry.name, exclude):
+                continue
+            try:
+                if entry.is_dir():
+                    if depth >= max_depth:
+                        continue
+                    st = entry.stat()
+                    key = (st.st_dev, st.st_ino)
+                    if key in visited:
+                        continue
+                    visited.add(key)
+                    subfolders.append(entry.path)
+                elif depth >= min_depth and entry.is_file()\
+                        and matches(entry.name, include):
+                    file_list.append(entry.path)
+            except OSError:
+                continue
+
+        stack.extend((f, depth + 1) for f in reversed(subfolders))
+
+    return file_list
+
+def stat_paths(paths, workers=16):
+    # Stats paths on a thread pool, since on network mounts most of the
+    # time is spent waiting on the server. Returns {path: stat_result},
+    # None for paths that can't be reached.
+    from concurrent.futures import ThreadPoolExecutor
+
+    def stat(path):
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    paths = list(set(paths))
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths))))\
+            as executor:
+        return dict(zip(paths, executor.map(stat, paths)))
+
+class ProcessPool:
+    # Runs command lines in at most `workers` concurrent processes.
+    # Meant to be driven from a modal operator's timer: poll() starts
+    # queued jobs and returns those finished since the last call, as
+    # (job, returncode, output_tail) tuples.
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        self.queue = collections.deque()
+        self.running = []
+        self.total = 0
+
+    def add(self, job, args):
+        self.queue.append((job, args))
+        self.total += 1
+
+    def poll(self):
+        finished = []
+        for item in self.running[:]:
+            job, process, output = item
+            if process.poll() is None:
+                continue
+            self.running.remove(item)
+            output.seek(0)
+            tail = output.read()[-2000:].decode('utf-8', 'replace')
+            output.close()
+            finished.append((job, process.returncode, tail))
+
+        while self.queue and len(self.running) < self.workers:
+            job, args = self.queue.popleft()
+            output = tempfile.TemporaryFile()
+            try:
+                process = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                                           stdout=output,
+                                           stderr=subprocess.STDOUT)
+            except OSError as e:
+                output.close()
+                finished.append((job, -1, str(e)))
+                continue
+            self.running.append((job, process, output))
+
+        return finished
+
+    def cancel(self):
+        self.queue.clear()
+        for job, process, output in self.running:
+            process.kill()
+            process.wait()
+            output.close()
+        self.running = []
+
+    @property
+    def done(self):
+        return not (self.queue or self.running)
+
+# Run by each worker Blender of batch_apply_preset on its opened file,
+# as: --python-expr BATCH_PRESET_SCRIPT -- module preset preview report
+BATCH_PRESET_SCRIPT = '''
+import bpy, addon_utils, json, sys
+module_name, preset_path, preview, report_path = \\
+    sys.argv[sys.argv.index('--') + 1:]
+result = dict(file=bpy.data.filepath, changed=0, failed=[],
+              preview=False, error=None)
+try:
+    mod = addon_utils.enable(module_name)
+    changed, failed = mod.apply_preset(mod.load_preset(preset_path))
+    result.update(changed=len(changed), failed=failed)
+    if preview == '1':
+        bpy.ops.render.oha_opengl(sync=True)
+        result['preview'] = True
+    bpy.ops.wm.save_mainfile()
+except Exception as e:
+    result['error'] = '%s: %s' % (type(e).__name__, e)
+with open(report_path, 'w') as f:
+    json.dump(result, f)
+if not bpy.app.background:
+    bpy.ops.wm.quit_blender()
+'''
+
+def batch_preset_args(blendfile, preset_path, render_preview, report_path):
+    # Blender command line applying a JSON preset to blendfile. OpenGL
+    # previews need a window, so those workers don't run in background.
+    args = [bpy.app.binary_path]
+    if not render_preview:
+        args.append('--background')
+    return args + [blendfile, '--python-expr', BATCH_PRESET_SCRIPT, '--',
+                   __name__, preset_path, '1' if render_preview else '0',
+                   report_path]
+
+def batch_preset_result(blendfile, returncode, output, report_path):
+    try:
+        with open(report_path, encoding='utf-8') as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        result = dict(file=blendfile, changed=0, failed=[], preview=False,
+                      error="Worker exited with %d: %s"
+                      % (returncode, output.strip()[-500:]))
+    result['file'] = blendfile
+    return result
+
+def batch_report(preset_path, results, report_path=None):
+    results.sort(key=lambda r: r['file'])
+    report = dict(preset=preset_path,
+                  files=len(results),
+                  errors=len([r for r in results if r['error']]),
+                  results=results)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+    return report
+
+def batch_preset_pool(preset_path, blendfiles, workers, render_preview,
+                      temp_dir):
+    # Jobs are (blendfile, job_report) with the worker's own report
+    # written in temp_dir. .py presets are converted to JSON there.
+    if preset_path.endswith('.py'):
+        json_path = os.path.join(temp_dir, 'preset.json')
+        write_preset(json_path, convert_py_preset(preset_path))
+        preset_path = json_path
+
+    pool = ProcessPool(workers)
+    for i, blendfile in enumerate(blendfiles):
+        job_report = os.path.join(temp_dir, '%d.json' % i)
+        pool.add((blendfile, job_report),
+                 batch_preset_args(blendfile, preset_path, render_preview,
+                                   job_report))
+    return pool
+
+def batch_apply_preset(preset_path, blendfiles, workers=4,
+                       render_preview=False, report_path=None):
+    # Applies a preset to many .blend files, each opened, changed and
+    # saved by its own Blender process, at most `workers` at once.
+    # Blocks until done; meant for scripts and farm jobs, e.g.
+    #   blender -b --python-expr "import animation_tools as oha;
+    #       oha.batch_apply_preset('qc.json', ['a.blend', 'b.blend'])"
+    # Returns the report dict, also written as JSON to report_path
+    # when given.
+    temp_dir = tempfile.mkdtemp(prefix='oha_batch_')
+    pool = batch_preset_pool(preset_path, blendfiles, workers,
+                             render_preview, temp_dir)
+
+    results = []
+    while not pool.done:
+        for (blendfile, job_report), returncode, output in pool.poll():
+            results.append(batch_preset_result(blendfile, returncode,
+                                               output, job_report))
+        time.sleep(0.2)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return batch_report(preset_path, results, report_path)
+
+# Nama folder output didapat dengan mengganti folder file .blend terbuka
+# dengan apapun yang ditentukan pengguna. Nama file output didapat
+# dengan menghapus ekstensi file .blend terbuka.
+def preview_filepath(blendpath, render_folder, ffmpeg_format):
+    safechars = '_-.()' + string.digits + string.ascii_letters
+    base_folder = ''.join(c for c in render_folder if c in safechars)
+    if not blendpath:
+        return None
+    blenddir, blendfile = os.path.split(blendpath)
+    blenddir0, blenddir1 = os.path.split(blenddir)
+    if not blenddir1:
+        return None
+    format_ext_dict = { "MPEG1" : '.mpg',
+                        "MPEG2" : '.mp2',
+                        "MPEG4" : '.mp4',
+                        "AVI" : '.avi',
+                        "QUICKTIME" : '.mov',
+                        "DV" : '.dv',
+                        "H264" : '.mp4',
+                        "XVID" : '.avi',
+                        "OGG" : '.ogg',
+                        "MKV" : '.mkv',
+                        "FLASH" : '.flv',
+                        "WAV" : '.wav',
+                        "MP3" : '.mp3'}
+    renderfile = os.path.splitext(blendfile)[0]\
+        + format_ext_dict.get(ffmpeg_format)
+    return os.path.join(blenddir0, base_folder, renderfile)
+
+def preview_note(template, blendpath):
+    # %(user)s and %(path)s of the stamp note template filled in.
+    import getpass
+
+    return template % dict(user=getpass.getuser(),
+                           path=bpy.path.basename(blendpath) if blendpath
+                               else "*unsaved*")
+
+def burn_in_filepath(filepath):
+    base, ext = os.path.splitext(filepath)
+    return base + '_burnin' + ext
+
+def burn_in_font():
+    # Blender's bundled font, passed to drawtext so ffmpeg builds
+    # without fontconfig (most static Windows builds) can still draw.
+    # None if it isn't installed as a plain .ttf file.
+    folder = bpy.utils.system_resource('DATAFILES', 'fonts')
+    if not folder:
+        return None
+    for name in ('bfont.ttf', 'droidsans.ttf', 'bmonofont-i18n.ttf'):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def process_failure(name, output):
+    # name with the last line a failed process printed, for reports.
+    lines = [l.strip() for l in output.splitlines() if l.strip()]
+    return '%s (%s)' % (name, lines[-1][:200]) if lines else name
+
+def burn_in_args(filepath, text_dir, note, frame_start, shot='',
+                 font_size=20, background=(0, 0, 0, .5), bitrate=6000,
+                 fontfile=None):
+    # ffmpeg command drawing the note (bottom left), frame numbers from
+    # frame_start (bottom right) and the shot name (top left) over a
+    # rendered movie, written to burn_in_filepath(filepath). The render
+    # itself is kept, so metadata can be burnt again. Texts go through
+    # files in text_dir, so only paths need filtergraph escaping.
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+
+    def escape(path):
+        return path.replace('\\', '/').replace(':', '\\\\:')
+
+    def textfile(name, text):
+        path = os.path.join(text_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return escape(path)
+
+    style = ':fontsize=%d:fontcolor=white:box=1:boxcolor=0x%02x%02x%02x@%.2f'\
+        % ((font_size,) + tuple(int(c * 255) for c in background[:3])
+           + (background[3],))
+    if fontfile:
+        style += ':fontfile=%s' % escape(fontfile)
+    filters = ['drawtext=textfile=%s:expansion=none:x=10:y=h-th-10%s'
+               % (textfile('note.txt', note), style),
+               'drawtext=text=%%{frame_num}:start_number=%d'
+               ':x=w-tw-10:y=h-th-10%s' % (frame_start, style)]
+    if shot:
+        filters.append('drawtext=textfile=%s:expansion=none:x=10:y=10%s'
+                       % (textfile('shot.txt', shot), style))
+    return [ffmpeg, '-y', '-v', 'error', '-i', filepath,
+            '-vf', ','.join(filters), '-b:v', '%dk' % bitrate,
+            '-c:a', 'copy', burn_in_filepath(filepath)]
+
+def burn_in_options(load):
+    # burn_in_args keywords from OHA_RenderOpenGL_Settings.
+    return dict(font_size=load.render_stamp_font_size,
+                background=tuple(load.render_stamp_background),
+                bitrate=load.ffmpeg_video_bitrate,
+                fontfile=burn_in_font())
+
+def burn_in_movies(movies, note, font_size=20, background=(0, 0, 0, .5),
+                   bitrate=6000, fontfile=None):
+    # Burns metadata into (filepath, frame_start, shot) movies one after
+    # another. Returns the failures, as file paths with ffmpeg's error.
+    text_dir = tempfile.mkdtemp(prefix='oha_burn_in_')
+    failed = []
+    try:
+        for filepath, frame_start, shot in movies:
+            args = burn_in_args(filepath, text_dir, note, frame_start, shot,
+                                font_size, background, bitrate, fontfile)
+            if args is None:
+                failed.append('%s (ffmpeg not found)' % filepath)
+                continue
+            result = subprocess.run(args, stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                failed.append(process_failure(
+                    filepath, result.stderr.decode('utf-8', 'replace')))
+    finally:
+        shutil.rmtree(text_dir, ignore_errors=True)
+    return failed
+
+def marker_shots(scene):
+    # Splits the scene frame range into shots, one per timeline marker,
+    # each lasting until the next marker. Frames before the first marker
+    # aren't part of any shot. Returns (name, frame_start, frame_end,
+    # camera) tuples; camera is the marker's bound camera or None.
+    markers = sorted(scene.timeline_markers, key=lambda m: m.frame)
+    shots = []
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].frame - 1 if i + 1 < len(markers)\
+            else scene.frame_end
+        start = max(marker.frame, scene.frame_start)
+        end = min(end, scene.frame_end)
+        if start <= end:
+            shots.append((marker.name, start, end, marker.camera))
+    return shots
+
+def shot_filename(name):
+    # A shot name with anything but safe characters replaced by '_'.
+    safechars = '_-.()' + string.digits + string.ascii_letters
+    return ''.join(c if c in safechars else '_' for c in name)
+
+def shot_filepath(filepath, name):
+    # render/file.mp4 -> render/file/<name>.mp4
+    base, ext = os.path.splitext(filepath)
+    return os.path.join(base, shot_filename(name) + ext)
+
+def duplicate_shots(shots):
+    # Names of shots that would render to the same file as another.
+    names = collections.defaultdict(list)
+    for shot in shots:
+        names[shot_filename(shot[0])].append(shot[0])
+    return sorted(n for same in names.values() if len(same) > 1
+                  for n in same)
+
+# Run by each worker Blender of a parallel shot render, on a copy of
+# the scene with preview settings applied, as:
+#   --python-expr SHOT_RENDER_SCRIPT -- camera start end filepath
+SHOT_RENDER_SCRIPT = '''
+import bpy, sys, traceback
+camera, start, end, filepath = sys.argv[sys.argv.index('--') + 1:]
+try:
+    scene = bpy.context.scene
+    scene.frame_start = int(start)
+    scene.frame_end = int(end)
+    if camera:
+        scene.camera = bpy.data.objects[camera]
+    scene.render.filepath = filepath
+    bpy.ops.render.opengl(animation=True, view_context=False)
+except Exception:
+    traceback.print_exc()
+bpy.ops.wm.quit_blender()
+'''
+
+def shot_render_args(blendfile, camera, frame_start, frame_end, filepath):
+    # OpenGL rendering needs a window, so workers don't run in
+    # background.
+    return [bpy.app.binary_path, blendfile,
+            '--python-expr', SHOT_RENDER_SCRIPT, '--',
+            camera.name if camera else '', str(frame_start), str(frame_end),
+            filepath]
+
+def read_blend_thumbnail(filepath):
+    # Reads the thumbnail Blender stores in a .blend file's TEST block,
+    # right after the file header. Returns (width, height, rgba_bytes)
+    # with rows bottom to top, or None when there's no thumbnail.
+    import gzip
+
+    try:
+        raw = open(filepath, 'rb')
+    except OSError:
+        return None
+
+    with raw:
+        f = raw
+        if raw.read(2) == b'\x1f\x8b':
+            f = gzip.GzipFile(fileobj=raw, mode='rb')
+        raw.seek(0)
+
+        try:
+            head = f.read(12)
+            if len(head) < 12 or head[:7] != b'BLENDER':
+                return None
+            endian = '<' if head[8:9] == b'v' else '>'
+            bhead = struct.Struct(endian + '4si'
+                                  + ('Q' if head[7:8] == b'-' else 'I')
+                                  + 'ii')
+
+            while True:
+                data = f.read(bhead.size)
+                if len(data) < bhead.size:
+                    return None
+                code, size = bhead.unpack(data)[:2]
+                if code == b'TEST':
+                    width, height = struct.unpack(endian + '2i', f.read(8))
+                    pixels = f.read(width * height * 4)
+                    if width <= 0 or len(pixels) != width * height * 4:
+                        return None
+                    return width, height, pixels
+                if code in (b'DNA1', b'ENDB'):
+                    return None
+                f.seek(size, 1)
+        except (OSError, EOFError, struct.error):
+            return None
+
+# Blocks of the ID types that refer to external files, and their path
+# fields, by SDNA name.
+BLEND_PATH_BLOCKS = (b'LI\0\0', b'IM\0\0', b'SO\0\0', b'MC\0\0',
+                     b'VF\0\0', b'CF\0\0')
+BLEND_PATH_FIELDS = (b'name[1024]', b'filepath[1024]')
+
+def blend_dna_field_offsets(dna, endian, pointer_size, fields):
+    # Byte offsets of the named fields in each struct of a DNA1 block,
+    # as {struct index: [offset, ...]}. Structs are laid out without
+    # implicit padding, so offsets are the sums of the field sizes.
+    import re
+
+    def strings(pos, tag):
+        if dna[pos:pos + 4] != tag:
+            raise ValueError("bad DNA block")
+        count = struct.unpack_from(endian + 'i', dna, pos + 4)[0]
+        pos += 8
+        names = []
+        for i in range(count):
+            end = dna.index(b'\0', pos)
+            names.append(dna[pos:end])
+            pos = end + 1
+        return names, (pos + 3) & ~3
+
+    if dna[:4] != b'SDNA':
+        raise ValueError("bad DNA block")
+    names, pos = strings(4, b'NAME')
+    types, pos = strings(pos, b'TYPE')
+    if dna[pos:pos + 4] != b'TLEN':
+        raise ValueError("bad DNA block")
+    lengths = struct.unpack_from(endian + '%dh' % len(types), dna, pos + 4)
+    pos = (pos + 4 + 2 * len(types) + 3) & ~3
+    if dna[pos:pos + 4] != b'STRC':
+        raise ValueError("bad DNA block")
+    count = struct.unpack_from(endian + 'i', dna, pos + 4)[0]
+    pos += 8
+
+    offsets = {}
+    for index in range(count):
+        type_index, field_count = struct.unpack_from(endian + '2h', dna, pos)
+        pos += 4
+        offset = 0
+        for i in range(field_count):
+            field_type, field_name = struct.unpack_from(endian + '2h',
+                                                        dna, pos)
+            pos += 4
+            name = names[field_name]
+            items = 1
+            for n in re.findall(rb'\[(\d+)\]', name):
+                items *= int(n)
+            size = pointer_size if name.startswith((b'*', b'(*'))\
+                else lengths[field_type]
+            if name in fields:
+                offsets.setdefault(index, []).append(offset)
+            offset += size * items
+    return offsets
+
+def read_blend_relative_paths(filepath):
+    # Paths relative to the file itself ("//...") stored in a .blend
+    # file's libraries, images, sounds, movie clips, fonts and cache
+    # files, found through the file's SDNA. Returns None when the file
+    # can't be read.
+    import gzip
+
+    try:
+        raw = open(filepath, 'rb')
+    except OSError:
+        return None
+
+    with raw:
+        f = raw
+        if raw.read(2) == b'\x1f\x8b':
+            f = gzip.GzipFile(fileobj=raw, mode='rb')
+        raw.seek(0)
+
+        try:
+            head = f.read(12)
+            if len(head) < 12 or head[:7] != b'BLENDER':
+                return None
+            endian = '<' if head[8:9] == b'v' else '>'
+            pointer_size = 8 if head[7:8] == b'-' else 4
+            bhead = struct.Struct(endian + '4si'
+                                  + ('Q' if pointer_size == 8 else 'I')
+                                  + 'ii')
+
+            blocks = []
+            dna = None
+            while True:
+                data = f.read(bhead.size)
+                if len(data) < bhead.size:
+                    return None
+                code, size, address, sdna_index, count = bhead.unpack(data)
+                if code == b'ENDB':
+                    break
+                if code in BLEND_PATH_BLOCKS:
+                    blocks.append((sdna_index, f.read(size)))
+                elif code == b'DNA1':
+                    dna = f.read(size)
+                else:
+                    f.seek(size, 1)
+            if dna is None:
+                return None
+
+            offsets = blend_dna_field_offsets(dna, endian, pointer_size,
+                                              BLEND_PATH_FIELDS)
+            paths = []
+            for sdna_index, data in blocks:
+                for offset in offsets.get(sdna_index, ()):
+                    path = data[offset:offset + 1024].split(b'\0', 1)[0]
+                    if path.startswith(b'//'):
+                        paths.append(path.decode('utf-8', 'replace'))
+            return paths
+        except (OSError, EOFError, struct.error, ValueError, IndexError):
+            return None
+
+def write_png(filepath, width, height, rgba):
+    # Minimal RGBA PNG writer, rows given bottom to top as Blender
+    # stores them. Written through a temporary file so readers never
+    # see a partial image.
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data\
+            + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    stride = width * 4
+    rows = b''.join(b'\x00' + rgba[y * stride:(y + 1) * stride]
+                    for y in range(height - 1, -1, -1))
+    png = b'\x89PNG\r\n\x1a\n'\
+        + chunk(b'IHDR', struct.pack('>2I5B', width, height, 8, 6, 0, 0, 0))\
+        + chunk(b'IDAT', zlib.compress(rows, 6))\
+        + chunk(b'IEND', b'')
+
+    temp_path = '%s.%d.tmp' % (filepath, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(png)
+    os.replace(temp_path, filepath)
+
+def quicklink_thumbnail_path(filepath, create=False):
+    # On-disk thumbnail cache, keyed by .blend file path and mtime so a
+    # saved-over file gets a new thumbnail. With create, the thumbnail is
+    # extracted when not cached yet. Returns None for files without one.
+    import hashlib
+
+    try:
+        mtime = os.stat(filepath).st_mtime
+    except OSError:
+        return None
+    key = hashlib.sha1(("%s|%r" % (filepath, mtime)).encode('utf-8'))
+    thumb_path = os.path.join(quicklink_preview_cache(),
+                              key.hexdigest() + '.png')
+    none_path = thumb_path[:-4] + '.none'
+
+    if os.path.exists(thumb_path):
+        return thumb_path
+    if not create or os.path.exists(none_path):
+        return None
+
+    os.makedirs(quicklink_preview_cache(), exist_ok=True)
+    thumb = read_blend_thumbnail(filepath)
+    if thumb is None:
+        # Remember files without thumbnail, so they're not reread.
+        open(none_path, 'wb').close()
+        return None
+    write_png(thumb_path, *thumb)
+    return thumb_path
+
+# Icons are loaded lazily, only for list rows actually drawn, and the
+# least recently drawn ones released past QUICKLINK_PREVIEW_LIMIT.
+QUICKLINK_PREVIEW_LIMIT = 256
+quicklink_previews = None
+quicklink_preview_icons = collections.OrderedDict()
+quicklink_preview_paths = {}
+
+def quicklink_preview_icon(filepath):
+    global quicklink_previews
+
+    icon_id = quicklink_preview_icons.get(filepath)
+    if icon_id is not None:
+        quicklink_preview_icons.move_to_end(filepath)
+        return icon_id
+
+    if filepath not in quicklink_preview_paths:
+        quicklink_preview_paths[filepath] = quicklink_thumbnail_path(filepath)
+    thumb_path = quicklink_preview_paths[filepath]
+    if thumb_path is None:
+        return 0
+
+    if quicklink_previews is None:
+        try:
+            import bpy.utils.previews
+        except ImportError:
+            return 0
+        quicklink_previews = bpy.utils.previews.new()
+
+    icon_id = quicklink_previews.load(filepath, thumb_path, 'IMAGE').icon_id
+    quicklink_preview_icons[filepath] = icon_id
+    while len(quicklink_preview_icons) > QUICKLINK_PREVIEW_LIMIT:
+        old_path, old_icon = quicklink_preview_icons.popitem(last=False)
+        del quicklink_previews[old_path]
+
+    return icon_id
+
+def quicklink_previews_clear():
+    global quicklink_previews
+
+    if quicklink_previews is not None:
+        import bpy.utils.previews
+        bpy.utils.previews.remove(quicklink_previews)
+        quicklink_previews = None
+    quicklink_preview_icons.clear()
+    quicklink_preview_paths.clear()
+
+def probe_movie(filepath):
+    # Reads frame count, frame rate, start timecode (None if the movie
+    # has none) and audio presence of a movie with ffprobe. Returns None
+    # when ffprobe is unavailable or fails.
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe is None:
+        return None
+    try:
+        out = subprocess.check_output(
+            [ffprobe, '-v', 'error', '-print_format', 'json',
+             '-show_streams', '-show_format', filepath],
+            stderr=subprocess.DEVNULL, timeout=60)
+        probe = json.loads(out.decode('utf-8', 'replace'))
+        streams = probe['streams']
+    except (OSError, ValueError, KeyError, subprocess.SubprocessError):
+        return None
+
+    video = [st for st in streams if st.get('codec_type') == 'video']
+    if not video:
+        return None
+    video = video[0]
+
+    try:
+        num, den = video.get('r_frame_rate', '0/1').split('/')
+        fps = float(num) / float(den)
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+    frames = int(video.get('nb_frames') or 0)
+    if not frames and fps:
+        frames = int(round(float(video.get('duration') or 0) * fps))
+
+    # QuickTime keeps the timecode on a data stream, others on the video
+    # stream or the container.
+    timecodes = [st.get('tags', {}).get('timecode') for st in streams]
+    timecodes.append(probe.get('format', {}).get('tags', {}).get('timecode'))
+    timecode = video.get('tags', {}).get('timecode')\
+        or next((tc for tc in timecodes if tc), None)
+
+    return dict(frames=frames, fps=fps, timecode=timecode,
+                has_audio=any(st.get('codec_type') == 'audio'
+                              for st in streams))
+
+def probe_movies(filepaths, workers=8):
+    # ffprobe runs in its own process, so threads are enough to probe
+    # many files at once. Returns {filepath: probe or None}.
+    from concurrent.futures import ThreadPoolExecutor
+
+    filepaths = list(set(filepaths))
+    if not filepaths or shutil.which('ffprobe') is None:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers,
+                                                   len(filepaths))))\
+            as executor:
+        return dict(zip(filepaths, executor.map(probe_movie, filepaths)))
+
+def add_grouped_movie_strips(context, entries, probes=None):
+    # Creates movie and sound strips for a list of entries, dicts with
+    # 'filepath', 'name', 'channel' and 'frame_start' keys (frame_start
+    # None places the strip right after the previous one), optionally
+    # trimmed by 'frame_final_start'/'frame_final_end'. probes are
+    # probe_movies results: a probed file is placed by its frame count
+    # and only gets a sound strip if it has audio, so Blender doesn't
+    # open it again to find out. Each file's strips are grouped into a
+    # metastrip as soon as they're made, in the same pass.
+    if probes is None:
+        probes = {}
+    scene = context.scene
+    if scene.sequence_editor is None:
+        scene.sequence_editor_create()
+    sequences = scene.sequence_editor.sequences
+
+    for strip in scene.sequence_editor.sequences_all:
+        strip.select = False
+
+    metas = []
+    frame_end = scene.frame_start
+    for entry in entries:
+        filepath = entry['filepath']
+        name = entry['name']
+        channel = entry['channel']
+        frame_start = entry['frame_start']
+        if frame_start is None:
+            frame_start = frame_end
+
+        strips = [sequences.new_movie(name, filepath, channel, frame_start)]
+        probe = probes.get(filepath)
+        if probe is None or probe['has_audio']:
+            try:
+                strips.append(sequences.new_sound(name, filepath,
+                                                  channel + 1, frame_start))
+            except RuntimeError:
+                pass
+
+        for strip in strips:
+            if 'frame_final_start' in entry:
+                strip.frame_final_start = entry['frame_final_start']
+                strip.frame_final_end = entry['frame_final_end']
+            strip.select = True
+        if 'frame_final_end' in entry:
+            frame_end = entry['frame_final_end']
+        elif probe != None and probe['frames']:
+            frame_end = frame_start + probe['frames']
+        else:
+            frame_end = max(strip.frame_final_end for strip in strips)
+
+        bpy.ops.sequencer.meta_make()
+        meta = scene.sequence_editor.active_strip
+        meta.name = '%.50s_group' % name
+        meta.select = False
+        metas.append(meta)
+
+    return metas
+
+def proxy_filepath(filepath, size, directory):
+    # Where a strip with proxy directory expects a Blender-style proxy:
+    # <directory>/<file>/proxy_NN.avi
+    return os.path.join(directory, os.path.basename(filepath),
+                        'proxy_%d.avi' % size)
+
+def proxy_build_args(filepath, size, output):
+    # ffmpeg command building an MJPEG proxy of filepath into output,
+    # whose folder must exist.
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+    scale = size / 100.0
+    return [ffmpeg, '-y', '-v', 'error', '-i', filepath, '-an',
+            '-vf', 'scale=trunc(iw*%(s)g/2)*2:trunc(ih*%(s)g/2)*2'
+            % dict(s=scale),
+            '-c:v', 'mjpeg', '-q:v', '3', output]
+
+def timecode_to_frames(tc, fps):
+    # HH:MM:SS:FF (';' for drop-frame is read the same) or plain frames.
+    tc = tc.strip().replace(';', ':')
+    if ':' not in tc:
+        return int(tc)
+    hh, mm, ss, ff = [int(v) for v in tc.split(':')]
+    return ((hh * 60 + mm) * 60 + ss) * fps + ff
+
+def parse_edl(filepath, fps):
+    # Reads video events of a CMX3600 EDL as dicts with 'file',
+    # 'source_in', 'source_out', 'record_in', 'channel' and 'timecode'
+    # (always True here). The file is the event's "* FROM CLIP NAME:"
+    # comment, falling back to its reel. Record times are relative to
+    # the first event; source times are absolute timecodes, the clip's
+    # start timecode still to be subtracted.
+    events = []
+    event = None
+    with open(filepath, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0].isdigit() and len(fields) >= 8:
+                # Track B is audio and video together.
+                track = fields[2].upper()
+                if 'V' not in track and track != 'B':
+                    event = None
+                    continue
+                # Only cuts are placed, transitions carry a duration
+                # field before the timecodes.
+                src_in, src_out, rec_in, rec_out = fields[-4:]
+                event = dict(file=fields[1],
+                             source_in=timecode_to_frames(src_in, fps),
+                             source_out=timecode_to_frames(src_out, fps),
+                             record_in=timecode_to_frames(rec_in, fps),
+                             channel=1,
+                             timecode=True)
+                events.append(event)
+            elif line.startswith('*') and 'FROM CLIP NAME:' in line.upper()\
+                    and events and event is events[-1]:
+                event['file'] = line.split(':', 1)[1].strip()
+
+    if events:
+        record_start = min(e['record_in'] for e in events)
+        for e in events:
+            e['record_in'] -= record_start
+    return events
+
+def parse_edit_csv(filepath, fps):
+    # Reads a cut list CSV with file, source_in, source_out, record_in
+    # and optional channel columns, by header name or in that order.
+    # Times are frames or HH:MM:SS:FF timecodes; 'timecode' is True for
+    # events whose source times are timecodes, which like in EDLs count
+    # from the clip's start timecode rather than from 0.
+    import csv
+
+    columns = ['file', 'source_in', 'source_out', 'record_in', 'channel']
+    events = []
+    with open(filepath, newline='', encoding='utf-8', errors='replace')\
+            as f:
+        rows = list(csv.reader(f))
+    if rows and rows[0] and rows[0][0].strip().lower() in columns:
+        columns = [c.strip().lower() for c in rows[0]]
+        rows = rows[1:]
+
+    for row in rows:
+        values = dict(zip(columns, [v.strip() for v in row]))
+        if not values.get('file'):
+            continue
+        events.append(dict(
+            file=values['file'],
+            source_in=timecode_to_frames(values['source_in'], fps),
+            source_out=timecode_to_frames(values['source_out'], fps),
+            record_in=timecode_to_frames(values['record_in'], fps),
+            channel=int(values.get('channel') or 1),
+            timecode=':' in values['source_in'] + values['source_out']))
+    return events
+
+def resolve_media_files(names, directory, extensions):
+    # Maps each referenced name to a file in directory (recursively),
+    # scanning the tree once. Names may be given with or without
+    # extension; absolute names pointing to existing files are kept.
+    found = {}
+    for f in scan_files(directory, 8, include=['*'], exclude=['.*']):
+        base = os.path.basename(f)
+        stem, ext = os.path.splitext(base)
+        if ext.lower() not in extensions:
+            continue
+        found.setdefault(base.lower(), f)
+        found.setdefault(stem.lower(), f)
+
+    resolved = {}
+    for name in set(names):
+        if os.path.isabs(name) and os.path.isfile(name):
+            resolved[name] = name
+        else:
+            resolved[name] = found.get(os.path.basename(name).lower())
+    return resolved
+
+def link_groups(context, requests, make_instance=True, make_proxy=True,
+                failed_files=None):
+    # Links groups for a list of (group_name, file_path) requests,
+    # opening each library file once for all of its groups. Each request
+    # then gets its own instance empty, placed like link_append does (3D
+    # cursor, active layer), and a proxy of the group's first armature.
+    # Returns a list of (group, instance) pairs in request order, with
+    # None in place of groups that couldn't be linked. Library files
+    # that can't be read are skipped and, when given, appended to the
+    # failed_files list.
+    scene = context.scene
+
+    wanted = {}
+    for g, f in requests:
+        wanted.setdefault(f, set()).add(g)
+
+    linked = {}
+    for f, group_names in wanted.items():
+        profile_count('libraries_opened')
+        try:
+            with bpy.data.libraries.load(library_link_path(f), link=True,
+                                         relative=True)\
+                    as (data_from, data_to):
+                names = [g for g in data_from.groups if g in group_names]
+                data_to.groups = names
+        except OSError:
+            if failed_files is not None:
+                failed_files.append(f)
+            continue
+        for g, group in zip(names, data_to.groups):
+            if group is not None:
+                linked[(g, f)] = group
+                library_mark_source(group.library, f)
+
+    result = []
+    for g, f in requests:
+        group = linked.get((g, f))
+        if group is None or not make_instance:
+            result.append((group, None))
+            continue
+
+        empty = bpy.data.objects.new(group.name, None)
+        empty.dupli_type = 'GROUP'
+        empty.dupli_group = group
+        empty.location = scene.cursor_location
+        empty.layers = [i == scene.active_layer for i in range(20)]
+        scene.objects.link(empty)
+        result.append((group, empty))
+
+    if not (make_instance and make_proxy):
+        return result
+
+    # There's no RNA function for proxies, proxy_make works on the
+    # active object.
+    for group, empty in result:
+        if empty is None:
+            continue
+        rig_list = [o.name for o in group.objects if o.type == 'ARMATURE']
+        if not rig_list:
+            continue
+        scene.objects.active = empty
+        empty.select = True
+        bpy.ops.object.proxy_make(object = rig_list[0])
+        context.active_object.name = group.name + "_rig"
+
+    return result
+
+class GroupPrefixIndex:
+    # Longest-prefix lookup of group names, for matching object names
+    # like "tree.004" to group "tree". Names are hashed and looked up by
+    # each distinct name length, longest first, so the cost grows with
+    # the number of different lengths instead of the number of groups.
+    # The first file listed for a group name wins.
+    def __init__(self, groups):
+        self.files = {}
+        for g, f in groups:
+            self.files.setdefault(g, f)
+        self.lengths = sorted(set(len(g) for g in self.files), reverse=True)
+
+    def longest_prefix(self, name):
+        for length in self.lengths:
+            if length > len(name):
+                continue
+            g = name[:length]
+            if g in self.files:
+                return g, self.files[g]
+        return None
+
+class GroupTable:
+    # QuickLink's (group name, file path) listing. Each file path is
+    # stored once in paths; groups are a name list and a parallel array
+    # of path indices. Iterating gives (name, path) pairs.
+    #
+    # selected holds the (name, path) pairs checked for batch linking.
+    # The list rows are rebuilt on every filter change, so the checks
+    # live here; clear() and replace() keep them, and prune_selected()
+    # drops the ones no longer listed.
+    __slots__ = ('names', 'path_ids', 'paths', 'path_index', 'selected')
+
+    def __init__(self, groups=()):
+        import array
+
+        self.names = []
+        self.path_ids = array.array('I')
+        self.paths = []
+        self.path_index = {}
+        self.selected = set()
+        self.extend(groups)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        paths = self.paths
+        return ((name, paths[i]) for name, i
+                in zip(self.names, self.path_ids))
+
+    def path_id(self, path):
+        i = self.path_index.get(path)
+        if i is None:
+            i = self.path_index[path] = len(self.paths)
+            self.paths.append(path)
+        return i
+
+    def append(self, name, path):
+        self.names.append(name)
+        self.path_ids.append(self.path_id(path))
+
+    def extend(self, groups):
+        for name, path in groups:
+            self.append(name, path)
+
+    def clear(self):
+        del self.names[:]
+        del self.path_ids[:]
+        del self.paths[:]
+        self.path_index.clear()
+
+    def replace(self, groups):
+        if groups is not self:
+            self.clear()
+            self.extend(groups)
+
+    def prune_selected(self):
+        if self.selected:
+            self.selected.intersection_update(self)
+
+    def selected_groups(self):
+        # Checked (name, path) pairs in listing order.
+        if not self.selected:
+            return []
+        return [g for g in self if g in self.selected]
+
+    def filter(self, text, limit=None):
+        # Case-insensitive substring match on group name or file path,
+        # like matching "name + path". Returns up to limit (name, path)
+        # pairs and the total number of matches.
+        text = text.lower()
+        if not text:
+            total = len(self.names)
+            return list(itertools.islice(self, limit)), total
+
+        path_match = [text in p.lower() for p in self.paths]
+        result = []
+        total = 0
+        for name, i in zip(self.names, self.path_ids):
+            if path_match[i] or text in name.lower():
+                total += 1
+                if limit is None or total <= limit:
+                    result.append((name, self.paths[i]))
+        return result, total
+
+    def to_json(self):
+        return json.dumps(dict(paths=self.paths, names=self.names,
+                               path_ids=self.path_ids.tolist()))
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        table = cls()
+        if isinstance(data, list):
+            # Listings cached before the table, as [name, path] pairs.
+            table.extend(data)
+            return table
+        table.paths = data['paths']
+        table.path_index = dict((p, i) for i, p in enumerate(table.paths))
+        table.names = data['names']
+        table.path_ids.extend(data['path_ids'])
+        if len(table.names) != len(table.path_ids)\
+                or (table.path_ids
+                    and max(table.path_ids) >= len(table.paths)):
+            raise ValueError("inconsistent group table")
+        return table
+
+def bake_action_fcurves(obj, only_selected, only_visible):
+    # The active action's f-curves that bake_action works on.
     action = obj.animation_data.action
 
     bones = [b for b in obj.data.bones if b.select] if only_selected else []
 
+    fcurves = []
     for fcurve in action.fcurves:
         if only_visible and fcurve.hide:
             continue
@@ -57,9 +1170,16 @@ def bake_action(obj, frame_start, frame_end, only_selected, only_visible):
                 not True in map(lambda bone: bone.name in fcurve.data_path,
                                 bones):
             continue
+        fcurves.append(fcurve)
+    return fcurves
 
+def bake_action(obj, frame_start, frame_end, only_selected, only_visible):
+    action = obj.animation_data.action
+
+    for fcurve in bake_action_fcurves(obj, only_selected, only_visible):
         if len(fcurve.modifiers) == 1 and fcurve.modifiers[0].type == 'CYCLES':
             cm = fcurve.modifiers[0]
+            profile_count('fcurves_touched')
 
             key_min = min(fcurve.keyframe_points, key=lambda x: x.co.x)
             key_max = max(fcurve.keyframe_points, key=lambda x: x.co.x)
@@ -89,6 +1209,7 @@ def bake_action(obj, frame_start, frame_end, only_selected, only_visible):
                     key_offset = -(count * key_delta_before)
                     key_new = fcurve.keyframe_points.insert(
                         key.co.x+key_offset.x, key.co.y+key_offset.y)
+                    profile_count('keyframes_inserted')
                     key_new.handle_left_type = key.handle_left_type
                     key_new.handle_right_type = key.handle_right_type
                     key_new.handle_left = key.handle_left + key_offset
@@ -109,6 +1230,7 @@ def bake_action(obj, frame_start, frame_end, only_selected, only_visible):
                     key_offset = count * key_delta_after
                     key_new = fcurve.keyframe_points.insert(
                         key.co.x+key_offset.x, key.co.y+key_offset.y)
+                    profile_count('keyframes_inserted')
                     key_new.handle_left_type = key.handle_left_type
                     key_new.handle_right_type = key.handle_right_type
                     key_new.handle_left = key.handle_left + key_offset
@@ -125,6 +1247,562 @@ def bake_action(obj, frame_start, frame_end, only_selected, only_visible):
     return action
 
 
+def fcurves_by_path(action):
+    return dict(((fc.data_path, fc.array_index), fc) for fc in action.fcurves)
+
+def write_fcurve_keys(action, data_path, index, frames, values, group='',
+                      fcurves=None):
+    # Replaces an f-curve's keys between the first and last of frames
+    # by frames/values, set in bulk with foreach_set instead of
+    # inserting keys one by one. An existing curve is kept, with its
+    # keys outside that range, modifiers, extrapolation and flags; a
+    # missing one is made in group. fcurves is an optional
+    # fcurves_by_path dict, kept up to date.
+    if fcurves is None:
+        fcurves = fcurves_by_path(action)
+    fcurve = fcurves.get((data_path, index))
+    if fcurve is None:
+        fcurve = action.fcurves.new(data_path, index, group)
+        fcurves[(data_path, index)] = fcurve
+    elif frames:
+        first, last = min(frames), max(frames)
+        points = fcurve.keyframe_points
+        for i in reversed(range(len(points))):
+            if first <= points[i].co.x <= last:
+                points.remove(points[i])
+
+    points = fcurve.keyframe_points
+    start = len(points)
+    points.add(len(frames))
+    co = [0.0] * (2 * len(points))
+    points.foreach_get('co', co)
+    co[2 * start::2] = frames
+    co[2 * start + 1::2] = values
+    points.foreach_set('co', co)
+    # Sorts the new keys among the kept ones and sets their handles.
+    fcurve.update()
+
+    profile_count('fcurves_touched')
+    profile_count('keyframes_inserted', len(frames))
+    return fcurve
+
+def visual_bake_pose(context, obj, pbones, frame_start, frame_end, step=1):
+    # Bakes the constrained (visual) transform of pbones into bone-local
+    # keys. The scene is evaluated once per frame for all bones; the
+    # keys are then written per channel in bulk, replacing only the
+    # keys in the baked range. Each pose matrix is made local by
+    # convert_space while its frame is set, so against the parent's
+    # evaluated matrix at that frame and honoring the bone's inherit
+    # and local location options. Returns the action written to.
+    scene = context.scene
+    frames = list(range(frame_start, frame_end + 1, max(1, step)))
+    matrices = dict((pb.name, []) for pb in pbones)
+
+    frame_current = scene.frame_current
+    for frame in frames:
+        scene.frame_set(frame)
+        for pb in pbones:
+            matrices[pb.name].append(obj.convert_space(
+                pose_bone=pb, matrix=pb.matrix,
+                from_space='POSE', to_space='LOCAL'))
+    scene.frame_set(frame_current)
+
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    action = obj.animation_data.action
+    if action is None:
+        action = obj.animation_data.action = \
+            bpy.data.actions.new(obj.name + "Action")
+    fcurves = fcurves_by_path(action)
+
+    for pb in pbones:
+        channels = dict(location=[], scale=[], rotation=[])
+        previous = None
+        for m in matrices[pb.name]:
+            loc, rot, scale = m.decompose()
+            channels['location'].append(loc)
+            channels['scale'].append(scale)
+            if pb.rotation_mode == 'QUATERNION':
+                if previous is not None and previous.dot(rot) < 0:
+                    rot.negate()
+            elif pb.rotation_mode == 'AXIS_ANGLE':
+                axis, angle = rot.to_axis_angle()
+                rot = [angle, axis[0], axis[1], axis[2]]
+            elif previous is not None:
+                rot = rot.to_euler(pb.rotation_mode, previous)
+            else:
+                rot = rot.to_euler(pb.rotation_mode)
+            channels['rotation'].append(rot)
+            previous = rot
+
+        rotation_path = dict(QUATERNION='rotation_quaternion',
+                             AXIS_ANGLE='rotation_axis_angle')\
+            .get(pb.rotation_mode, 'rotation_euler')
+        for name, path in (('location', 'location'), ('scale', 'scale'),
+                           ('rotation', rotation_path)):
+            values = channels[name]
+            data_path = 'pose.bones["%s"].%s' % (pb.name, path)
+            for index in range(len(values[0])):
+                write_fcurve_keys(action, data_path, index, frames,
+                                  [v[index] for v in values],
+                                  group=pb.name, fcurves=fcurves)
+
+    return action
+
+def channel_default(data_path, index):
+    # Rest value of a transform channel: what an unanimated property
+    # holds, and what the first NLA strip blends from.
+    prop = data_path.rsplit('.', 1)[-1]
+    if prop == 'scale':
+        return 1.0
+    if prop == 'rotation_quaternion' and index == 0:
+        return 1.0
+    if prop == 'rotation_axis_angle' and index == 2:
+        return 1.0
+    return 0.0
+
+def nla_strip_time(strip, frame):
+    # Action time of a clip strip at a scene frame, as Blender maps it:
+    # scaled, repeated, optionally reversed. Frames outside the strip
+    # are held at its ends.
+    frame = min(max(frame, strip.frame_start), strip.frame_end)
+    length = strip.action_frame_end - strip.action_frame_start
+    scale = strip.scale or 1.0
+    offset = frame - strip.frame_start
+    if length <= 0:
+        local = 0.0
+    elif offset >= length * scale * strip.repeat:
+        # The last frame of the last repeat ends the cycle, not
+        # restarts it.
+        local = length
+    else:
+        local = (offset % (length * scale)) / scale
+    if strip.use_reverse:
+        return strip.action_frame_end - local
+    return strip.action_frame_start + local
+
+def nla_strip_influence(strip, frame):
+    if strip.use_animated_influence:
+        for fcurve in strip.fcurves:
+            if fcurve.data_path == 'influence':
+                return fcurve.evaluate(frame)
+        return strip.influence
+    frame = min(max(frame, strip.frame_start), strip.frame_end)
+    if strip.blend_in > 0 and frame < strip.frame_start + strip.blend_in:
+        return (frame - strip.frame_start) / strip.blend_in
+    if strip.blend_out > 0 and frame > strip.frame_end - strip.blend_out:
+        return (strip.frame_end - frame) / strip.blend_out
+    return 1.0
+
+def nla_track_frames(track, frames):
+    # Which strip of a track evaluates each frame, honoring the strips'
+    # extrapolation. Returns {strip: [frame index, ...]}. Only action
+    # clips are evaluated; transitions and meta strips are skipped.
+    strips = [s for s in track.strips
+              if not s.mute and s.type == 'CLIP' and s.action != None]
+    assigned = collections.OrderedDict()
+    for i, frame in enumerate(frames):
+        chosen = None
+        for n, strip in enumerate(strips):
+            if strip.frame_start <= frame <= strip.frame_end:
+                chosen = strip
+                break
+            if frame < strip.frame_start:
+                if n == 0 and strip.extrapolation == 'HOLD':
+                    chosen = strip
+                break
+            chosen = strip\
+                if strip.extrapolation in ('HOLD', 'HOLD_FORWARD') else None
+        if chosen != None:
+            assigned.setdefault(chosen, []).append(i)
+    return assigned
+
+def nla_blend(lower, values, influences, blend_type):
+    # Blends a strip's sampled values onto the accumulated lower stack,
+    # all lists aligned by frame, with the formulas of Blender 2.7x's
+    # nlaevalchan_accumulate: the value is weighted by the influence
+    # first, so MULTIPLY scales the stack by value * influence.
+    if blend_type == 'ADD':
+        return [l + v * w for l, v, w in zip(lower, values, influences)]
+    if blend_type == 'SUBTRACT':
+        return [l - v * w for l, v, w in zip(lower, values, influences)]
+    if blend_type == 'MULTIPLY':
+        return [l * (v * w) for l, v, w in zip(lower, values, influences)]
+    return [l * (1.0 - w) + v * w
+            for l, v, w in zip(lower, values, influences)]
+
+def nla_layer(indices, times, influences):
+    # Drops the frames where a strip has no influence, Blender doesn't
+    # evaluate it there.
+    kept = [n for n, w in enumerate(influences) if abs(w) >= 1e-7]
+    return ([indices[n] for n in kept], [times[n] for n in kept],
+            [influences[n] for n in kept])
+
+def flatten_nla(obj, frame_start, frame_end, step=1, mute_tracks=True):
+    # Evaluates the object's NLA stack, bottom track first, plus the
+    # active action on top, and writes the result to a single new
+    # action. Each strip's f-curves are sampled once over the frames it
+    # covers and blended as whole lists. Returns the new action, or
+    # None if there's nothing to flatten.
+    anim = obj.animation_data
+    frames = list(range(frame_start, frame_end + 1, max(1, step)))
+
+    solo = [t for t in anim.nla_tracks if t.is_solo]
+    layers = []
+    for track in (solo or anim.nla_tracks):
+        if track.mute and not track.is_solo:
+            continue
+        for strip, indices in nla_track_frames(track, frames).items():
+            times = [nla_strip_time(strip, frames[i]) for i in indices]
+            influences = [nla_strip_influence(strip, frames[i])
+                          for i in indices]
+            layers.append((strip.action, strip.blend_type)
+                          + nla_layer(indices, times, influences))
+    if anim.action != None and not anim.use_tweak_mode:
+        layers.append((anim.action, anim.action_blend_type)
+                      + nla_layer(list(range(len(frames))), frames,
+                                  [anim.action_influence] * len(frames)))
+    if not layers:
+        return None
+
+    # Like Blender 2.7x's nlaevalchan_accumulate, the first strip to
+    # write a channel at a frame sets it to its value outright, whatever
+    # its blend type and influence.
+    channels = collections.OrderedDict()
+    written = {}
+    groups = {}
+    for action, blend_type, indices, times, influences in layers:
+        if not indices:
+            continue
+        for fcurve in action.fcurves:
+            if fcurve.mute:
+                continue
+            key = (fcurve.data_path, fcurve.array_index)
+            if key not in channels:
+                channels[key] = [channel_default(*key)] * len(frames)
+                written[key] = [False] * len(frames)
+                groups[key] = fcurve.group.name if fcurve.group else ''
+            accumulated = channels[key]
+            done = written[key]
+            lower = [accumulated[i] for i in indices]
+            values = [fcurve.evaluate(t) for t in times]
+            profile_count('keyframes_sampled', len(values))
+            blended = nla_blend(lower, values, influences, blend_type)
+            for i, v, b in zip(indices, values, blended):
+                accumulated[i] = b if done[i] else v
+                done[i] = True
+
+    action = bpy.data.actions.new(obj.name + "Flattened")
+    fcurves = {}
+    for (data_path, index), values in channels.items():
+        write_fcurve_keys(action, data_path, index, frames, values,
+                          group=groups[(data_path, index)], fcurves=fcurves)
+
+    anim.action = action
+    anim.action_blend_type = 'REPLACE'
+    anim.action_influence = 1.0
+    if mute_tracks:
+        for track in anim.nla_tracks:
+            track.mute = True
+    return action
+
+# Pose cache files: the magic, the byte length of a JSON index, the
+# index padded to 4 bytes, then per-key arrays for all curves back to
+# back, little endian: co, handle_left and handle_right as float32
+# pairs, interpolation and both handle types as uint8 codes into the
+# index's enum lists. A curve's keys are the index's [start,
+# start+count) slice of each array.
+POSE_CACHE_MAGIC = b'OHAPOSE\x01'
+POSE_CACHE_INTERPOLATION = ('CONSTANT', 'LINEAR', 'BEZIER', 'SINE', 'QUAD',
+                            'CUBIC', 'QUART', 'QUINT', 'EXPO', 'CIRC',
+                            'BACK', 'BOUNCE', 'ELASTIC')
+POSE_CACHE_HANDLE_TYPES = ('FREE', 'VECTOR', 'ALIGNED', 'AUTO',
+                           'AUTO_CLAMPED')
+POSE_CACHE_CYCLES = ('mode_before', 'mode_after',
+                     'cycles_before', 'cycles_after')
+
+def write_pose_cache(filepath, action):
+    # Returns the number of keys written.
+    import array
+    import sys
+
+    interpolation_code = dict((name, i) for i, name
+                              in enumerate(POSE_CACHE_INTERPOLATION))
+    handle_code = dict((name, i) for i, name
+                       in enumerate(POSE_CACHE_HANDLE_TYPES))
+    floats = dict((name, array.array('f'))
+                  for name in ('co', 'handle_left', 'handle_right'))
+    codes = dict((name, array.array('B')) for name
+                 in ('interpolation', 'handle_left_type', 'handle_right_type'))
+    curves = []
+
+    start = 0
+    for fcurve in action.fcurves:
+        points = fcurve.keyframe_points
+        count = len(points)
+        buf = [0.0] * (2 * count)
+        for name, values in floats.items():
+            points.foreach_get(name, buf)
+            values.extend(buf)
+        for k in points:
+            codes['interpolation'].append(interpolation_code[k.interpolation])
+            codes['handle_left_type'].append(handle_code[k.handle_left_type])
+            codes['handle_right_type'].append(handle_code[k.handle_right_type])
+
+        curve = collections.OrderedDict([
+            ('data_path', fcurve.data_path),
+            ('index', fcurve.array_index),
+            ('group', fcurve.group.name if fcurve.group else ''),
+            ('extrapolation', fcurve.extrapolation),
+            ('start', start),
+            ('count', count)])
+        cycles = [m for m in fcurve.modifiers if m.type == 'CYCLES']
+        if cycles:
+            curve['cycles'] = dict((attr, getattr(cycles[0], attr))
+                                   for attr in POSE_CACHE_CYCLES)
+        curves.append(curve)
+        start += count
+
+    index = json.dumps(collections.OrderedDict([
+        ('action', action.name),
+        ('keys', start),
+        ('interpolation', POSE_CACHE_INTERPOLATION),
+        ('handle_types', POSE_CACHE_HANDLE_TYPES),
+        ('curves', curves)])).encode('utf-8')
+    index += b' ' * (-len(index) % 4)
+
+    if sys.byteorder != 'little':
+        for values in floats.values():
+            values.byteswap()
+
+    temp_path = '%s.%d.tmp' % (filepath, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(POSE_CACHE_MAGIC)
+        f.write(struct.pack('<I', len(index)))
+        f.write(index)
+        for name in ('co', 'handle_left', 'handle_right'):
+            floats[name].tofile(f)
+        for name in ('interpolation', 'handle_left_type', 'handle_right_type'):
+            codes[name].tofile(f)
+    os.replace(temp_path, filepath)
+    return start
+
+def read_pose_cache(filepath):
+    # Rebuilds a pose cache file as a new action. The file is memory
+    # mapped and its arrays passed straight to foreach_set.
+    import array
+    import mmap
+    import sys
+
+    with open(filepath, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    views = []
+    try:
+        header = len(POSE_CACHE_MAGIC) + 4
+        if mm[:len(POSE_CACHE_MAGIC)] != POSE_CACHE_MAGIC:
+            raise ValueError("not a pose cache file")
+        index_length = struct.unpack('<I', mm[len(POSE_CACHE_MAGIC):header])[0]
+        index = json.loads(mm[header:header + index_length].decode('utf-8'))
+        keys = index['keys']
+
+        offset = header + index_length
+        if len(mm) < offset + 27 * keys:
+            raise ValueError("truncated pose cache file")
+        sections = {}
+        for name in ('co', 'handle_left', 'handle_right'):
+            view = memoryview(mm)[offset:offset + 8 * keys]
+            views.append(view)
+            if sys.byteorder == 'little':
+                sections[name] = view.cast('f')
+                views.append(sections[name])
+            else:
+                sections[name] = array.array('f', view.tobytes())
+                sections[name].byteswap()
+            offset += 8 * keys
+        for name in ('interpolation', 'handle_left_type', 'handle_right_type'):
+            sections[name] = mm[offset:offset + keys]
+            offset += keys
+
+        interpolation = index['interpolation']
+        handle_types = index['handle_types']
+        action = bpy.data.actions.new(index['action'])
+        for curve in index['curves']:
+            fcurve = action.fcurves.new(curve['data_path'], curve['index'],
+                                        curve['group'])
+            fcurve.extrapolation = curve['extrapolation']
+            start, count = curve['start'], curve['count']
+            points = fcurve.keyframe_points
+            points.add(count)
+            for name in ('co', 'handle_left', 'handle_right'):
+                points.foreach_set(
+                    name, sections[name][2 * start:2 * (start + count)])
+            for k, i, l, r in zip(
+                    points,
+                    sections['interpolation'][start:start + count],
+                    sections['handle_left_type'][start:start + count],
+                    sections['handle_right_type'][start:start + count]):
+                k.interpolation = interpolation[i]
+                k.handle_left_type = handle_types[l]
+                k.handle_right_type = handle_types[r]
+            if 'cycles' in curve:
+                cm = fcurve.modifiers.new(type='CYCLES')
+                for attr, value in curve['cycles'].items():
+                    setattr(cm, attr, value)
+            fcurve.update()
+            profile_count('fcurves_touched')
+            profile_count('keyframes_inserted', count)
+    finally:
+        for view in reversed(views):
+            view.release()
+        mm.close()
+    return action
+
+def fcurve_bone_name(data_path):
+    if data_path.startswith('pose.bones["'):
+        return data_path[12:].split('"]', 1)[0]
+    return None
+
+def retime_fcurves(fcurves, scale=1.0, offset=0.0, bone_offsets={}):
+    # Maps key times t to t * scale + offset, plus a per-bone offset
+    # from bone_offsets. Keys and handles are read and written in bulk;
+    # modifiers' restricted ranges move with the keys. Returns the
+    # number of keys moved.
+    moved = 0
+    for fcurve in fcurves:
+        shift = offset + bone_offsets.get(fcurve_bone_name(fcurve.data_path),
+                                          0.0)
+        points = fcurve.keyframe_points
+        buf = [0.0] * (2 * len(points))
+        for name in ('co', 'handle_left', 'handle_right'):
+            points.foreach_get(name, buf)
+            buf[0::2] = [x * scale + shift for x in buf[0::2]]
+            points.foreach_set(name, buf)
+
+        for m in fcurve.modifiers:
+            if m.use_restricted_range:
+                # Set in an order that never puts start past end.
+                start = m.frame_start * scale + shift
+                end = m.frame_end * scale + shift
+                if start > m.frame_end:
+                    m.frame_end, m.frame_start = end, start
+                else:
+                    m.frame_start, m.frame_end = start, end
+                m.blend_in *= scale
+                m.blend_out *= scale
+        fcurve.update()
+        moved += len(points)
+        profile_count('fcurves_touched')
+    return moved
+
+def handle_slope(co, handle):
+    dx = handle[0] - co[0]
+    return (handle[1] - co[1]) / dx if dx else 0.0
+
+def check_cycle_seams(fcurves, value_tolerance=1e-4, slope_tolerance=1e-3,
+                      fix=False):
+    # Checks where a cycled curve's last key meets its first. REPEAT needs
+    # matching values; REPEAT and REPEAT_OFFSET need the seam's inner
+    # handles to share a slope; MIRROR needs a flat inner handle at the
+    # mirrored end. Only the first and last keys are read. With fix, the
+    # last key (or the mirrored end's handle) is made to match and the
+    # touched handles set to FREE. Returns [(fcurve, [problem, ...])].
+    result = []
+    for fcurve in fcurves:
+        cm = fcurve.modifiers[0] if len(fcurve.modifiers) else None
+        points = fcurve.keyframe_points
+        if cm is None or cm.type != 'CYCLES' or len(points) < 2:
+            continue
+        first, last = points[0], points[-1]
+        modes = set((cm.mode_before, cm.mode_after))
+        bezier = first.interpolation == 'BEZIER'\
+            and points[-2].interpolation == 'BEZIER'
+        slope_first = handle_slope(first.co, first.handle_right)
+        slope_last = handle_slope(last.co, last.handle_left)
+        problems = []
+
+        if 'REPEAT' in modes and\
+                abs(last.co[1] - first.co[1]) > value_tolerance:
+            problems.append("value jump %.4g" % (last.co[1] - first.co[1]))
+            if fix:
+                delta = first.co[1] - last.co[1]
+                last.handle_left_type = last.handle_right_type = 'FREE'
+                last.co[1] += delta
+                last.handle_left[1] += delta
+                last.handle_right[1] += delta
+
+        if bezier and modes & set(('REPEAT', 'REPEAT_OFFSET')) and\
+                abs(slope_last - slope_first) > slope_tolerance:
+            problems.append("tangent break %.4g/%.4g"
+                            % (slope_last, slope_first))
+            if fix:
+                last.handle_left_type = 'FREE'
+                first.handle_right_type = 'FREE'
+                dx = last.handle_left[0] - last.co[0]
+                last.handle_left[1] = last.co[1] + slope_first * dx
+
+        for mode, key, handle in ((cm.mode_before, first, 'handle_right'),
+                                  (cm.mode_after, last, 'handle_left')):
+            if mode != 'MIRROR' or not bezier:
+                continue
+            slope = handle_slope(key.co, getattr(key, handle))
+            if abs(slope) > slope_tolerance:
+                problems.append("mirror end at frame %g not flat (%.4g)"
+                                % (key.co[0], slope))
+                if fix:
+                    setattr(key, handle + '_type', 'FREE')
+                    getattr(key, handle)[1] = key.co[1]
+
+        if problems:
+            if fix:
+                fcurve.update()
+            result.append((fcurve, problems))
+    return result
+
+def clean_static_fcurves(action, tolerance=1e-5, remove_rest=True,
+                         fcurves=None):
+    # Finds curves whose keys and handles stay within tolerance of one
+    # value. Transform curves at their rest value are removed when
+    # remove_rest is set, other static curves are collapsed to a single
+    # key, in place so the curve keeps its modifiers, extrapolation and
+    # flags. Curves with modifiers other than cycles are left alone.
+    # Returns (removed, collapsed, keys dropped).
+    rest_props = ('location', 'rotation_quaternion', 'rotation_euler',
+                  'rotation_axis_angle', 'scale')
+    removed = collapsed = dropped = 0
+    for fcurve in list(action.fcurves if fcurves is None else fcurves):
+        points = fcurve.keyframe_points
+        count = len(points)
+        if count == 0 or\
+                any(m.type != 'CYCLES' for m in fcurve.modifiers):
+            continue
+
+        co = [0.0] * (2 * count)
+        points.foreach_get('co', co)
+        values = co[1::2]
+        buf = [0.0] * (2 * count)
+        for name in ('handle_left', 'handle_right'):
+            points.foreach_get(name, buf)
+            values.extend(buf[1::2])
+        if max(values) - min(values) > tolerance:
+            continue
+
+        data_path, index = fcurve.data_path, fcurve.array_index
+        if remove_rest and data_path.rsplit('.', 1)[-1] in rest_props and\
+                abs(co[1] - channel_default(data_path, index)) <= tolerance:
+            action.fcurves.remove(fcurve)
+            removed += 1
+            dropped += count
+        elif count > 1:
+            # Last to first, so the indices still to remove stay valid.
+            for i in range(count - 1, 0, -1):
+                points.remove(points[i])
+            fcurve.update()
+            collapsed += 1
+            dropped += count - 1
+    return removed, collapsed, dropped
+
+
 # ======================================================================
 # ============================= Properties =============================
 # ======================================================================
@@ -174,6 +1852,18 @@ class OHA_RenderOpenGL_Settings(bpy.types.PropertyGroup):
     render_resolution_x                 = IntProperty()
     render_resolution_y                 = IntProperty()
     ffmpeg_video_bitrate                = IntProperty(default=6000)
+    burn_in                             = BoolProperty(\
+        name='Burn In',
+        description="Draw the stamp note, frame numbers and shot names with"\
+            +" ffmpeg after rendering instead of stamping every frame."\
+            +" Only for synchronous and shot renders, an interactive"\
+            +" preview render still stamps",
+        default=False)
+    shot_workers                        = IntProperty(\
+        name='Shot Processes',
+        description="Blender processes rendering marker shots at once,"\
+            +" 1 renders them in this session",
+        default=1, min=1, max=32)
 
     render_stamp_background             = FloatVectorProperty(subtype='COLOR', size=4,
                                                               default=(0,0,0,.5))
@@ -184,12 +1874,24 @@ class OHA_RenderOpenGL_Props(bpy.types.PropertyGroup):
     temp = PointerProperty(type = OHA_RenderOpenGL_Settings)
     load = PointerProperty(type = OHA_RenderOpenGL_Settings)
 
+def update_oha_quicklink_selected(self, context):
+    selected = context.scene.oha.quicklink_props.groups.selected
+    if self.selected:
+        selected.add((self.name, self.file_path))
+    else:
+        selected.discard((self.name, self.file_path))
+
 class OHA_QuickLink_BlendFile(bpy.types.PropertyGroup):
     name = StringProperty(
         options = {'HIDDEN', 'SKIP_SAVE'})
     file_path = StringProperty(
         subtype="FILE_PATH",
         options = {'HIDDEN', 'SKIP_SAVE'})
+    selected = BoolProperty(
+        name="Selected",
+        description="Include this group in batch linking.",
+        options = {'SKIP_SAVE'},
+        update=update_oha_quicklink_selected)
 
 def update_oha_quicklink_root_folder(self, context):
     bpy.ops.scene.oha_quicklink_populate('INVOKE_DEFAULT')
@@ -203,18 +1905,45 @@ def update_oha_quicklink_list_filter(self, context):
 class OHA_QuickLink_Props(bpy.types.PropertyGroup):
     root_folder = StringProperty(
         name="Root Folder",
-        description="Only .blend files two levels below this folder will be listed.",
+        description="Only .blend files in folders one to Scan Depth levels below this folder will be listed, not the ones directly in it.",
         subtype="DIR_PATH",
         update=update_oha_quicklink_root_folder)
+    scan_depth = IntProperty(
+        name="Scan Depth",
+        description="How many folder levels below the root folder are searched.",
+        default=2, min=1, max=32,
+        update=update_oha_quicklink_root_folder)
+    include_patterns = StringProperty(
+        name="Include",
+        description="Semicolon-separated glob patterns, only matching file names are scanned.",
+        default="*.blend",
+        update=update_oha_quicklink_root_folder)
+    exclude_patterns = StringProperty(
+        name="Exclude",
+        description="Semicolon-separated glob patterns, matching files and folders are skipped.",
+        default=".*",
+        update=update_oha_quicklink_root_folder)
     list_filter = StringProperty(
         name="List Filter",
         description="When not empty, filters the group list.",
         update=update_oha_quicklink_list_filter
         )
-    groups = []
+    show_previews = BoolProperty(
+        name="Show Previews",
+        description="Show the .blend file thumbnails in the group list.",
+        default=True)
+    max_items = IntProperty(
+        name="Max Items",
+        description="Most groups shown in the list, narrow the filter to see the rest.",
+        default=1000, min=10, max=100000,
+        update=update_oha_quicklink_list_filter)
+    # The whole listing stays in Python; only the filtered groups shown
+    # are copied into groups_collection.
+    groups = GroupTable()
     groups_collection = CollectionProperty(
         type=OHA_QuickLink_BlendFile)
     groups_index = IntProperty(default=0)
+    groups_matched = IntProperty(options={'SKIP_SAVE'})
 
 # Outermost property class
 class OHA_Props(bpy.types.PropertyGroup):
@@ -225,8 +1954,557 @@ class OHA_Props(bpy.types.PropertyGroup):
         type = OHA_QuickLink_Props,
         options = {'HIDDEN', 'SKIP_SAVE'})
 
-QUICKLINK_CACHE = os.path.join(bpy.utils.script_paths(subdir='addons')[-1],
-                               "oha_quicklink_cache")
+# Operator profiling, opt-in through the addon preferences. Records go
+# to profile_history for the panel and to a rotating log, cProfile
+# dumps next to it; both in the user config folder.
+PROFILE_HISTORY_SIZE = 100
+PROFILE_DUMPS_KEPT = 20
+profile_history = collections.deque(maxlen=PROFILE_HISTORY_SIZE)
+profile_logger = None
+
+def profile_folder():
+    return bpy.utils.user_resource('CONFIG', 'oha_profile', create=True)
+
+def profile_log(record):
+    global profile_logger
+
+    if profile_logger is None:
+        import logging
+        import logging.handlers
+
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(profile_folder(), 'operators.log'),
+            maxBytes=1 << 20, backupCount=5)
+        profile_logger = logging.getLogger('oha_profile')
+        profile_logger.propagate = False
+        profile_logger.setLevel(logging.INFO)
+        profile_logger.addHandler(handler)
+
+    profile_logger.info(json.dumps(record))
+
+def profile_dump(profiler, bl_idname):
+    folder = profile_folder()
+    profiler.dump_stats(os.path.join(
+        folder, '%s_%s.prof' % (time.strftime('%Y%m%d_%H%M%S'), bl_idname)))
+
+    dumps = sorted(f for f in os.listdir(folder) if f.endswith('.prof'))
+    for f in dumps[:-PROFILE_DUMPS_KEPT]:
+        os.remove(os.path.join(folder, f))
+
+def profile_call(cls, method, self, context, *args):
+    # An operator run is timed and its counters diffed from its first
+    # call, usually invoke, through all of its modal calls, and recorded
+    # once it finishes or gets cancelled. The state lives on the
+    # operator instance between calls. Methods called from within a
+    # profiled one, like execute from invoke, are counted in the outer
+    # call.
+    if getattr(self, 'oha_profile_busy', False):
+        return method(self, context, *args)
+
+    if getattr(self, 'oha_profile_time', None) is None:
+        prefs = addon_preferences()
+        self.oha_profile_time = 0.0
+        self.oha_profile_method = method.__name__
+        self.oha_profile_counters = profile_counters.copy()
+        self.oha_profiler = None
+        if prefs != None and prefs.profile_cprofile:
+            import cProfile
+            self.oha_profiler = cProfile.Profile()
+    profiler = self.oha_profiler
+
+    self.oha_profile_busy = True
+    start = time.perf_counter()
+    try:
+        if profiler:
+            result = profiler.runcall(method, self, context, *args)
+        else:
+            result = method(self, context, *args)
+    finally:
+        self.oha_profile_time += time.perf_counter() - start
+        self.oha_profile_busy = False
+
+    if method.__name__ != 'execute'\
+            and not result & {'FINISHED', 'CANCELLED'}:
+        return result
+
+    record = dict(operator=cls.bl_idname,
+                  method=self.oha_profile_method,
+                  time=self.oha_profile_time,
+                  result=sorted(result),
+                  counters=dict(profile_counters - self.oha_profile_counters),
+                  timestamp=time.strftime('%Y-%m-%d %H:%M:%S'))
+    self.oha_profile_time = None
+    profile_history.append(record)
+    profile_log(record)
+    if profiler:
+        profile_dump(profiler, cls.bl_idname)
+
+    return result
+
+PROFILED_METHODS = ('execute', 'invoke', 'modal')
+
+def instrument_operator(cls):
+    # Blender checks the argument count of registered methods, so the
+    # wrappers spell them out. It looks methods up on the class on each
+    # call, so they can be swapped while registered.
+    def profiled(method):
+        if method.__name__ == 'execute':
+            def wrapper(self, context):
+                return profile_call(cls, method, self, context)
+        else:
+            def wrapper(self, context, event):
+                return profile_call(cls, method, self, context, event)
+        functools.update_wrapper(wrapper, method)
+        wrapper.oha_profiled = True
+        return wrapper
+
+    for name in PROFILED_METHODS:
+        method = cls.__dict__.get(name)
+        if method is not None and not hasattr(method, 'oha_profiled'):
+            setattr(cls, name, profiled(method))
+
+def uninstrument_operator(cls):
+    for name in PROFILED_METHODS:
+        method = cls.__dict__.get(name)
+        if method is not None and hasattr(method, 'oha_profiled'):
+            setattr(cls, name, method.__wrapped__)
+
+def profile_operators_set(enabled):
+    # Operators are only wrapped while profiling is on, so they cost
+    # nothing otherwise.
+    for cls in operator_classes:
+        if enabled:
+            instrument_operator(cls)
+        else:
+            uninstrument_operator(cls)
+
+def update_oha_profile_operators(self, context):
+    profile_operators_set(self.profile_operators)
+
+# Cache locations are looked up on first QuickLink use, not at import.
+def quicklink_cache():
+    return os.path.join(bpy.utils.script_paths(subdir='addons')[-1],
+                        "oha_quicklink_cache")
+
+def quicklink_cache_db():
+    return quicklink_cache() + ".sqlite"
+
+class QuickLinkCache:
+    # QuickLink listings in SQLite, shared by every Blender session and
+    # farm job using the addon folder:
+    #
+    #     with QuickLinkCache(quicklink_cache_db()) as cache:
+    #         groups = cache.get(key)  # a GroupTable, or None
+    #
+    # Each use opens and closes its own connection. A listing is
+    # replaced in one transaction, so readers see either the old or the
+    # new one, never a partial write. Rollback journaling relies on file
+    # locks, which unlike WAL mode's shared memory also work on network
+    # mounts. Only the SIZE most recently written listings are kept.
+    #
+    # The cache is only an accelerator: if the database can't be opened
+    # or used (read-only folder, locked or corrupt file), get() misses,
+    # put() does nothing and error holds the reason.
+    SIZE = 10
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.db = None
+        self.error = None
+
+    def __enter__(self):
+        import sqlite3
+
+        try:
+            self.db = sqlite3.connect(self.filepath, timeout=30,
+                                      isolation_level=None)
+            self.db.execute("CREATE TABLE IF NOT EXISTS listings ("
+                            "key TEXT PRIMARY KEY, "
+                            "groups TEXT NOT NULL, "
+                            "written REAL NOT NULL)")
+        except sqlite3.Error as e:
+            self.error = e
+            self.close()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        import sqlite3
+
+        if self.db is not None:
+            try:
+                self.db.close()
+            except sqlite3.Error:
+                pass
+            self.db = None
+
+    def get(self, key):
+        import sqlite3
+
+        if self.db is None:
+            return None
+        try:
+            row = self.db.execute("SELECT groups FROM listings "
+                                  "WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            self.error = e
+            return None
+        if row is None:
+            return None
+        try:
+            return GroupTable.from_json(row[0])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def put(self, key, groups):
+        import sqlite3
+
+        if self.db is None:
+            return
+        data = groups.to_json()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("INSERT OR REPLACE INTO listings "
+                                "VALUES (?, ?, ?)", (key, data, time.time()))
+                self.db.execute("DELETE FROM listings WHERE key NOT IN "
+                                "(SELECT key FROM listings "
+                                "ORDER BY written DESC LIMIT ?)",
+                                (self.SIZE,))
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+        except sqlite3.Error as e:
+            self.error = e
+
+def quicklink_preview_cache():
+    return quicklink_cache() + "_previews"
+
+class LibraryMirror:
+    # Local copies of library .blend files, to link from a local disk
+    # instead of a network share:
+    #
+    #     path = mirror.resolve(filepath)  # the copy, or filepath
+    #
+    # Copies are named by the SHA-1 of their content under
+    # folder/objects, so identical files share one copy. manifest.json
+    # maps each source path to its copy, with the source's mtime and
+    # size when copied; a copy is used only while those still match.
+    # resolve() queues missing or stale files for a background thread,
+    # which copies them and then deletes the least recently used copies
+    # beyond the quota (in bytes). Only the thread copies files; the
+    # entries are shared under a lock.
+    #
+    # Blender resolves a library's own relative paths ("//textures/..",
+    # nested libraries) against the path it was linked from, which the
+    # copy doesn't share. Files holding such paths, or that can't be
+    # read as .blend files, are never mirrored: their entry has no sha1
+    # and they're linked from the source.
+    VERSION = 2
+
+    def __init__(self, folder, quota):
+        import queue
+        import threading
+
+        self.folder = folder
+        self.quota = quota
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.thread = None
+        self.manifest_path = os.path.join(folder, 'manifest.json')
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest['version'] != self.VERSION:
+                # Earlier copies weren't checked for relative paths.
+                shutil.rmtree(os.path.join(folder, 'objects'),
+                              ignore_errors=True)
+                manifest['entries'] = {}
+            self.entries = manifest['entries']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+
+    def object_path(self, sha1):
+        return os.path.join(self.folder, 'objects', sha1[:2], sha1 + '.blend')
+
+    def current_entry(self, filepath, st):
+        # filepath's entry if it's up to date with stat result st. Call
+        # with the lock held.
+        entry = self.entries.get(filepath)
+        if entry is None or entry['mtime'] != st.st_mtime\
+                or entry['size'] != st.st_size:
+            return None
+        return entry
+
+    def current(self, filepath, st):
+        # The copy of filepath if it's up to date with stat result st.
+        # Call with the lock held.
+        entry = self.current_entry(filepath, st)
+        if entry is None or entry['sha1'] is None:
+            return None
+        path = self.object_path(entry['sha1'])
+        return path if os.path.exists(path) else None
+
+    def resolve(self, filepath):
+        filepath = os.path.normpath(filepath)
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return filepath
+        with self.lock:
+            entry = self.current_entry(filepath, st)
+            if entry != None and entry['sha1'] is None:
+                return filepath
+            path = self.current(filepath, st)
+            if path != None:
+                entry['used'] = time.time()
+                return path
+        self.sync([filepath])
+        return filepath
+
+    def sync(self, filepaths):
+        import threading
+
+        with self.lock:
+            for f in filepaths:
+                f = os.path.normpath(f)
+                if f not in self.pending:
+                    self.pending.add(f)
+                    self.queue.put(f)
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run,
+                                           name='oha_library_mirror')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        if self.thread != None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(1.0)
+        self.save()
+
+    def run(self):
+        while True:
+            filepath = self.queue.get()
+            if filepath is None:
+                break
+            try:
+                self.copy(filepath)
+            except OSError:
+                pass
+            finally:
+                with self.lock:
+                    self.pending.discard(filepath)
+            if self.queue.empty():
+                self.evict()
+                self.save()
+
+    def copy(self, filepath):
+        import hashlib
+
+        st = os.stat(filepath)
+        with self.lock:
+            entry = self.current_entry(filepath, st)
+            if entry != None and (entry['sha1'] is None
+                                  or self.current(filepath, st) != None):
+                return
+
+        temp_folder = os.path.join(self.folder, 'tmp')
+        os.makedirs(temp_folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.blend', dir=temp_folder)
+        sha1 = hashlib.sha1()
+        try:
+            with open(filepath, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1 << 20), b''):
+                    sha1.update(chunk)
+                    dst.write(chunk)
+            # Read from the local copy, not again over the network.
+            relative = read_blend_relative_paths(temp_path)
+            if relative == []:
+                path = self.object_path(sha1.hexdigest())
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        # A file saved while being copied is picked up next time.
+        after = os.stat(filepath)
+        if (after.st_mtime, after.st_size) != (st.st_mtime, st.st_size):
+            return
+        with self.lock:
+            self.entries[filepath] = dict(
+                mtime=st.st_mtime, size=st.st_size,
+                sha1=sha1.hexdigest() if relative == [] else None,
+                used=time.time())
+
+    def evict(self):
+        with self.lock:
+            by_sha1 = {}
+            for f, entry in self.entries.items():
+                if entry['sha1'] != None:
+                    by_sha1.setdefault(entry['sha1'], []).append(entry)
+            total = sum(entries[0]['size'] for entries in by_sha1.values())
+            dropped = []
+            for used, sha1 in sorted((max(e['used'] for e in entries), sha1)
+                                     for sha1, entries in by_sha1.items()):
+                if total <= self.quota:
+                    break
+                total -= by_sha1[sha1][0]['size']
+                dropped.append(sha1)
+            dropped_set = set(dropped)
+            for f in [f for f, e in self.entries.items()
+                      if e['sha1'] in dropped_set]:
+                del self.entries[f]
+
+        for sha1 in dropped:
+            try:
+                os.remove(self.object_path(sha1))
+            except OSError:
+                pass
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(dict(version=self.VERSION,
+                                   entries=self.entries))
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            temp_path = '%s.%d.tmp' % (self.manifest_path, os.getpid())
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.manifest_path)
+        except OSError:
+            pass
+
+class OHA_AddonPreferences(bpy.types.AddonPreferences):
+    bl_idname = __name__
+
+    profile_operators = BoolProperty(
+        name="Profile Operators",
+        description="Record time and work done by each OHA operator to a log in the user config folder.",
+        default=False,
+        update=update_oha_profile_operators)
+    profile_cprofile = BoolProperty(
+        name="cProfile Dumps",
+        description="Also save a cProfile dump of each operator run, much slower.",
+        default=False)
+    profile_history = IntProperty(
+        name="History",
+        description="Number of operator runs listed in the profiling panel.",
+        default=10, min=1, max=PROFILE_HISTORY_SIZE)
+    mirror_libraries = BoolProperty(
+        name="Mirror Libraries",
+        description="Link library files from local copies, kept in sync in the background. Libraries with paths relative to themselves aren't copied, and opening a file still reads its libraries from their saved paths.",
+        default=False)
+    mirror_folder = StringProperty(
+        name="Mirror Folder",
+        description="Folder for the local library copies, defaults to the user data folder.",
+        subtype='DIR_PATH')
+    mirror_quota = IntProperty(
+        name="Quota (MB)",
+        description="Disk space for library copies, least recently used ones are removed first.",
+        default=10240, min=16)
+
+    def draw(self, context):
+        row = self.layout.row()
+        row.prop(self, "profile_operators")
+        row.prop(self, "profile_cprofile")
+        row.prop(self, "profile_history")
+
+        row = self.layout.row()
+        row.prop(self, "mirror_libraries")
+        sub = row.row()
+        sub.active = self.mirror_libraries
+        sub.prop(self, "mirror_folder", text="")
+        sub.prop(self, "mirror_quota")
+
+def addon_preferences():
+    addon = bpy.context.user_preferences.addons.get(__name__)
+    return addon.preferences if addon else None
+
+# The library mirror in use, made from the addon preferences on first
+# use while enabled.
+library_mirror = None
+
+def library_mirror_get():
+    global library_mirror
+
+    prefs = addon_preferences()
+    if prefs is None or not prefs.mirror_libraries:
+        return None
+    folder = bpy.path.abspath(prefs.mirror_folder)\
+        or bpy.utils.user_resource('DATAFILES', 'oha_library_mirror',
+                                   create=True)
+    if library_mirror is None or library_mirror.folder != folder:
+        if library_mirror != None:
+            library_mirror.stop()
+        library_mirror = LibraryMirror(folder, 0)
+    library_mirror.quota = prefs.mirror_quota << 20
+    return library_mirror
+
+def library_link_path(filepath):
+    # Where to link library filepath from: an already linked library
+    # for it, so it isn't linked twice under different paths, else its
+    # mirror copy if there's an up to date one.
+    filepath = os.path.normpath(bpy.path.abspath(filepath))
+    for lib in bpy.data.libraries:
+        path = bpy.path.abspath(lib.filepath)
+        if lib.get('oha_source') == filepath\
+                or os.path.normpath(path) == filepath:
+            return path
+    mirror = library_mirror_get()
+    return mirror.resolve(filepath) if mirror != None else filepath
+
+def library_mark_source(library, filepath):
+    # Records the original path of a library linked from a mirror copy,
+    # which is what gets saved in the .blend file.
+    filepath = os.path.normpath(bpy.path.abspath(filepath))
+    if os.path.normpath(bpy.path.abspath(library.filepath)) != filepath:
+        library['oha_source'] = filepath
+
+@persistent
+def library_mirror_save_pre(dummy):
+    # oha_source is absolute; a library linked relative is saved with a
+    # relative source path too, unless there's none (another drive).
+    for lib in bpy.data.libraries:
+        source = lib.get('oha_source')
+        if source:
+            lib['oha_mirror'] = lib.filepath
+            if lib.filepath.startswith('//') and bpy.data.filepath:
+                try:
+                    source = bpy.path.relpath(source)
+                except ValueError:
+                    pass
+            lib.filepath = source
+
+@persistent
+def library_mirror_save_post(dummy):
+    for lib in bpy.data.libraries:
+        mirror = lib.get('oha_mirror')
+        if mirror:
+            lib.filepath = mirror
+            del lib['oha_mirror']
+
+@persistent
+def library_mirror_load_post(dummy):
+    # Libraries are read before this runs, so reopening a file still
+    # reads them from their saved paths; this only refreshes the mirror
+    # for the next links.
+    mirror = library_mirror_get()
+    if mirror != None:
+        mirror.sync(bpy.path.abspath(lib.filepath)
+                    for lib in bpy.data.libraries)
+
+library_mirror_handlers = (
+    ('save_pre', library_mirror_save_pre),
+    ('save_post', library_mirror_save_post),
+    ('load_post', library_mirror_load_post),
+    )
+
 
 # ======================================================================
 # ============================== Operators =============================
@@ -238,7 +2516,25 @@ class RENDER_OT_oha_render_opengl_animation(bpy.types.Operator):
     bl_label = 'OHA OpenGL Render Animation'
     bl_options = {'REGISTER'}
 
+    sync = BoolProperty(
+        description="Render in the foreground and restore settings afterwards.",
+        options={'HIDDEN', 'SKIP_SAVE'})
+    shots = BoolProperty(
+        description="Render one file per timeline marker shot, with the marker's camera.",
+        options={'HIDDEN', 'SKIP_SAVE'})
+    workers = IntProperty(
+        description="Processes for shot rendering, 0 uses the preview settings.",
+        default=0, min=0,
+        options={'HIDDEN', 'SKIP_SAVE'})
+
     _timer = None
+    pool = None
+    shot_copy = ''
+    text_dir = ''
+    burn_jobs = {}
+    failed = []
+    shot_count = 0
+    shots_done = 0
 
     # Fungsi modifikasi setting render.
     def temp_settings(self, context):
@@ -257,41 +2553,23 @@ class RENDER_OT_oha_render_opengl_animation(bpy.types.Operator):
         for key in ffmpeg_settings_keys:
             setattr(ffmpeg, key, getattr(load, 'ffmpeg_'+key))
 
-        # Nama folder output didapat dengan mengganti folder file
-        # .blend terbuka dengan apapun yang ditentukan pengguna. Nama
-        # file output didapat dengan menghapus ekstensi file .blend
-        # terbuka.
         blendpath = context.blend_data.filepath
-        safechars = '_-.()' + string.digits + string.ascii_letters
-        base_folder = ''.join(c for c in load.render_filepath if c in safechars)
-        if blendpath:
-            blenddir, blendfile = os.path.split(blendpath)
-            blenddir0, blenddir1 = os.path.split(blenddir)
-            if blenddir1:
-                format_ext_dict = { "MPEG1" : '.mpg',
-                                    "MPEG2" : '.mp2',
-                                    "MPEG4" : '.mp4',
-                                    "AVI" : '.avi',
-                                    "QUICKTIME" : '.mov',
-                                    "DV" : '.dv',
-                                    "H264" : '.mp4',
-                                    "XVID" : '.avi',
-                                    "OGG" : '.ogg',
-                                    "MKV" : '.mkv',
-                                    "FLASH" : '.flv',
-                                    "WAV" : '.wav',
-                                    "MP3" : '.mp3'}
-                renderfile = os.path.splitext(blendfile)[0] + format_ext_dict.get(ffmpeg.format)
-                render.filepath = os.path.join(blenddir0, base_folder,
-                                               renderfile)
-        render.stamp_note_text = load.render_stamp_note_text\
-            % dict(user=getpass.getuser(),
-                   path=bpy.path.basename(blendpath) if blendpath\
-                       else "*unsaved*")
+        filepath = preview_filepath(blendpath, load.render_filepath,
+                                    ffmpeg.format)
+        if filepath:
+            render.filepath = filepath
+        render.stamp_note_text = preview_note(load.render_stamp_note_text,
+                                              blendpath)
+        # With burn-in, the metadata is drawn by one ffmpeg pass after
+        # rendering instead of stamped on every frame. The interactive
+        # render returns before it's done, nothing burns in after it,
+        # so it keeps stamping.
+        if load.burn_in and (self.shots or self.sync):
+            render.use_stamp = False
 
         # Only Render hanya berlaku jika area jendela di mana operator
         # ini dijalankan adalah 3D View.
-        if space.type == 'VIEW_3D':
+        if space != None and space.type == 'VIEW_3D':
             space.show_only_render = load.space_show_only_render
         # Tentukan format video, agar setting FFMPEG terpakai.
         image.file_format = load.image_file_format
@@ -307,23 +2585,168 @@ class RENDER_OT_oha_render_opengl_animation(bpy.types.Operator):
 
         return {'FINISHED'}
 
+    def burn_in(self, context, movies):
+        load = context.scene.oha.opengl_props.load
+        if not load.burn_in:
+            return []
+        return burn_in_movies(movies, preview_note(
+            load.render_stamp_note_text, context.blend_data.filepath),
+                              **burn_in_options(load))
+
+    def render_shots(self, context, shots):
+        # Renders shots one after another in this session, the frame
+        # range and camera put back afterwards. Returns the burn-in
+        # failures, see burn_in_movies.
+        scene = context.scene
+        saved = (scene.frame_start, scene.frame_end, scene.camera,
+                 scene.render.filepath)
+        movies = []
+        try:
+            for name, frame_start, frame_end, camera in shots:
+                scene.frame_start = frame_start
+                scene.frame_end = frame_end
+                if camera != None:
+                    scene.camera = camera
+                scene.render.filepath = shot_filepath(saved[3], name)
+                bpy.ops.render.opengl(animation=True, view_context=False)
+                movies.append((scene.render.filepath, frame_start, name))
+        finally:
+            scene.frame_start, scene.frame_end = saved[0], saved[1]
+            scene.camera, scene.render.filepath = saved[2], saved[3]
+        return self.burn_in(context, movies)
+
+    def start_shot_pool(self, context, shots, workers):
+        # Workers open a copy of the current state, saved next to the
+        # .blend file so relative paths still hold.
+        blenddir, blendfile = os.path.split(context.blend_data.filepath)
+        self.shot_copy = os.path.join(blenddir, '.%s.%d.oha_shots.blend'
+                                      % (os.path.splitext(blendfile)[0],
+                                         os.getpid()))
+        bpy.ops.wm.save_as_mainfile(filepath=self.shot_copy, copy=True)
+
+        # A shot's burn-in job is queued once its render finishes.
+        load = context.scene.oha.opengl_props.load
+        note = preview_note(load.render_stamp_note_text,
+                            context.blend_data.filepath)
+        self.text_dir = tempfile.mkdtemp(prefix='oha_burn_in_')
+        self.burn_jobs = {}
+
+        # The pool also runs the burn-in jobs, so shots are counted on
+        # their own: one is done once rendered and burnt in, or failed.
+        self.pool = ProcessPool(workers)
+        self.failed = []
+        self.shot_count = len(shots)
+        self.shots_done = 0
+        render_filepath = context.scene.render.filepath
+        for name, frame_start, frame_end, camera in shots:
+            filepath = shot_filepath(render_filepath, name)
+            self.pool.add(('render', name, filepath),
+                          shot_render_args(self.shot_copy, camera,
+                                           frame_start, frame_end, filepath))
+            if load.burn_in:
+                self.burn_jobs[name] = burn_in_args(
+                    filepath, tempfile.mkdtemp(dir=self.text_dir), note,
+                    frame_start, name, **burn_in_options(load))
+
+        wm = context.window_manager
+        wm.progress_begin(0, len(shots))
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        try:
+            os.remove(self.shot_copy)
+        except OSError:
+            pass
+        shutil.rmtree(self.text_dir, ignore_errors=True)
+
     def cancel(self, context):
-        context.window_manager.event_timer_remove(self._timer)
-        
+        self.pool.cancel()
+        self.finish(context)
+
         return {'CANCELLED'}
 
     def modal(self, context, event):
-        if event.type == 'TIMER':
-            return self.check_render_thread(context)
+        if event.type == 'ESC':
+            return self.cancel(context)
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        for (kind, name, filepath), returncode, output in self.pool.poll():
+            if kind == 'burn_in' and returncode != 0:
+                self.failed.append(process_failure(name, output))
+            elif returncode != 0 or not os.path.exists(filepath):
+                self.failed.append(name)
+            elif kind == 'render' and name in self.burn_jobs:
+                burn_job = self.burn_jobs.pop(name)
+                if burn_job != None:
+                    self.pool.add(('burn_in', name,
+                                   burn_in_filepath(filepath)), burn_job)
+                    continue
+                self.failed.append('%s (ffmpeg not found)' % name)
+            self.shots_done += 1
+        context.window_manager.progress_update(self.shots_done)
+        if not self.pool.done:
+            return {'PASS_THROUGH'}
 
-        return {'PASS_THROUGH'}
+        self.finish(context)
+        if self.failed:
+            self.report({'WARNING'}, "%d shots, failed: %s"
+                        % (self.shot_count, ", ".join(self.failed)))
+        else:
+            self.report({'INFO'}, "%d shots rendered" % self.shot_count)
+        return {'FINISHED'}
 
     def execute(self, context):
         wm = context.window_manager
 
+        if self.shots:
+            shots = marker_shots(context.scene)
+            if not shots:
+                self.report({'ERROR'}, "No timeline markers in frame range")
+                return {'CANCELLED'}
+            duplicates = duplicate_shots(shots)
+            if duplicates:
+                self.report({'ERROR'}, "Markers render to the same file,"
+                            " rename them: %s" % ", ".join(duplicates))
+                return {'CANCELLED'}
+            if not context.blend_data.filepath:
+                self.report({'ERROR'}, "Save the file to render shots")
+                return {'CANCELLED'}
+
         bpy.ops.render.oha_opengl_settings(save=True)
         self.temp_settings(context)
 
+        if self.shots:
+            workers = self.workers\
+                or context.scene.oha.opengl_props.load.shot_workers
+            if workers > 1:
+                result = self.start_shot_pool(context, shots, workers)
+            else:
+                failed = self.render_shots(context, shots)
+                if failed:
+                    self.report({'WARNING'}, "Burn-in failed: %s"
+                                % ", ".join(failed))
+                result = {'FINISHED'}
+            bpy.ops.render.oha_opengl_settings(save=False)
+            return result
+
+        if self.sync:
+            space = context.space_data
+            bpy.ops.render.opengl(animation=True, view_context=space != None
+                                  and space.type == 'VIEW_3D')
+            failed = self.burn_in(context, [(context.scene.render.filepath,
+                                             context.scene.frame_start, '')])
+            if failed:
+                self.report({'WARNING'}, "Burn-in failed: %s"
+                            % ", ".join(failed))
+            bpy.ops.render.oha_opengl_settings(save=False)
+            return {'FINISHED'}
+
         bpy.ops.render.opengl('INVOKE_DEFAULT', animation=True, view_context=True)
 
         return {'FINISHED'}
@@ -331,6 +2754,50 @@ class RENDER_OT_oha_render_opengl_animation(bpy.types.Operator):
     def invoke(self, context, event):
         return self.execute(context)
 
+class RENDER_OT_oha_burn_in(bpy.types.Operator):
+    """Burn the stamp note, frame numbers and shot names into the rendered previews again, without rendering."""
+    bl_idname = 'render.oha_burn_in'
+    bl_label = 'Burn In Metadata'
+    bl_options = {'REGISTER'}
+
+    shots = BoolProperty(
+        name="Shots",
+        description="Burn into the marker shot previews instead of the whole range preview.",
+        default=False)
+
+    @classmethod
+    def poll(self, context):
+        return context.blend_data.filepath != ''
+
+    def execute(self, context):
+        scene = context.scene
+        load = scene.oha.opengl_props.load
+        filepath = preview_filepath(context.blend_data.filepath,
+                                    load.render_filepath, load.ffmpeg_format)
+        if filepath is None:
+            self.report({'ERROR'}, "No preview path for this file")
+            return {'CANCELLED'}
+
+        if self.shots:
+            movies = [(shot_filepath(filepath, name), frame_start, name)
+                      for name, frame_start, frame_end, camera
+                      in marker_shots(scene)]
+        else:
+            movies = [(filepath, scene.frame_start, '')]
+        movies = [m for m in movies if os.path.exists(m[0])]
+        if not movies:
+            self.report({'ERROR'}, "No rendered previews found")
+            return {'CANCELLED'}
+
+        failed = burn_in_movies(movies, preview_note(
+            load.render_stamp_note_text, context.blend_data.filepath),
+                                **burn_in_options(load))
+        if failed:
+            self.report({'WARNING'}, "Burn-in failed: %s" % ", ".join(failed))
+        else:
+            self.report({'INFO'}, "%d previews burnt in" % len(movies))
+        return {'FINISHED'}
+
 class RENDER_OT_oha_render_opengl_animation_settings(bpy.types.Operator):
     """Return to previous render settings."""
     bl_idname = 'render.oha_opengl_settings'
@@ -348,7 +2815,7 @@ class RENDER_OT_oha_render_opengl_animation_settings(bpy.types.Operator):
         if not props.restored:
             return {'CANCELLED'}
 
-        if space.type == 'VIEW_3D':
+        if space != None and space.type == 'VIEW_3D':
             for key in space_settings_keys:
                 setattr(temp, 'space_'+key, getattr(space, key))
         for key in render_settings_keys:
@@ -371,7 +2838,7 @@ class RENDER_OT_oha_render_opengl_animation_settings(bpy.types.Operator):
         if props.restored:
             return {'CANCELLED'}
 
-        if space.type == 'VIEW_3D':
+        if space != None and space.type == 'VIEW_3D':
             for key in space_settings_keys:
                 setattr(space, key, getattr(temp, 'space_'+key))
         for key in render_settings_keys:
@@ -409,7 +2876,272 @@ image_settings_keys = [
 ffmpeg_settings_keys = [
     'format', 'codec', 'audio_codec', 'video_bitrate']
 
-class RENDER_OT_oha_render_qc_preset_add(AddPresetBase, bpy.types.Operator):
+# Preset folder listings, cached per folder until its mtime changes or
+# a preset operator writes to it. Shared by both preset menus.
+preset_listing_cache = {}
+
+def list_preset_dir(directory):
+    try:
+        mtime = os.stat(directory).st_mtime
+    except OSError:
+        return []
+
+    cached = preset_listing_cache.get(directory)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    # Not a context manager before Python 3.6, see scan_files.
+    try:
+        it = os.scandir(directory)
+        files = sorted(e.name for e in it
+                       if not e.name.startswith('.') and e.is_file())
+    except OSError:
+        files = []
+    preset_listing_cache[directory] = (mtime, files)
+    return files
+
+def invalidate_preset_listing(preset_subdir):
+    for directory in list(preset_listing_cache.keys()):
+        if os.path.basename(os.path.normpath(directory)) == preset_subdir:
+            del preset_listing_cache[directory]
+
+# Presets are stored as JSON: {"defines": {"render":
+# "bpy.context.scene.render", ...}, "values": [["render.use_stamp",
+# true], ...]}. Unlike .py presets they are parsed once, cached until
+# the file changes, and applied without exec.
+preset_values_cache = {}
+
+def resolve_data_path(path):
+    # "bpy.context.scene.render" to the object it names.
+    names = path.split('.')
+    if names[0] != 'bpy':
+        raise ValueError("Not a bpy path: %s" % path)
+    obj = bpy
+    for name in names[1:]:
+        obj = getattr(obj, name)
+    return obj
+
+def read_preset_values(preset_defines, preset_values):
+    # Current values for an AddPresetBase style preset_defines and
+    # preset_values pair, in the JSON preset layout.
+    defines = collections.OrderedDict()
+    for line in preset_defines:
+        name, path = line.split('=', 1)
+        defines[name.strip()] = path.strip()
+
+    targets = dict((name, resolve_data_path(path))
+                   for name, path in defines.items())
+    values = []
+    for path in preset_values:
+        name, attr = path.split('.', 1)
+        value = getattr(targets[name], attr)
+        if not isinstance(value, (bool, int, float, str)):
+            value = list(value)
+        values.append([path, value])
+
+    return dict(defines=defines, values=values)
+
+def convert_py_preset(filepath):
+    # Reads a .py preset written by AddPresetBase without running it:
+    # "name = bpy...." lines are defines, "name.attr = literal" lines
+    # are values. Anything else is ignored.
+    import ast
+
+    def dotted_name(node):
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute):
+            base = dotted_name(node.value)
+            return base and base + '.' + node.attr
+        return None
+
+    with open(filepath, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filepath)
+
+    defines = collections.OrderedDict()
+    values = []
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or len(node.targets) != 1:
+            continue
+        target = dotted_name(node.targets[0])
+        if target is None:
+            continue
+        if '.' not in target:
+            path = dotted_name(node.value)
+            if path and path.startswith('bpy.'):
+                defines[target] = path
+            continue
+        try:
+            value = ast.literal_eval(node.value)
+        except ValueError:
+            continue
+        if isinstance(value, tuple):
+            value = list(value)
+        values.append([target, value])
+
+    return dict(defines=defines, values=values)
+
+def write_preset(filepath, preset):
+    temp_path = '%s.%d.tmp' % (filepath, os.getpid())
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(preset, f, indent=1)
+    os.replace(temp_path, filepath)
+    preset_values_cache.pop(filepath, None)
+
+def load_preset(filepath):
+    mtime = os.stat(filepath).st_mtime
+    cached = preset_values_cache.get(filepath)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(filepath, encoding='utf-8') as f:
+        preset = json.load(f, object_pairs_hook=collections.OrderedDict)
+    preset_values_cache[filepath] = (mtime, preset)
+    return preset
+
+def preset_value_equal(current, value):
+    if isinstance(value, list):
+        return len(current) == len(value) and\
+            all(preset_value_equal(c, v) for c, v in zip(current, value))
+    if isinstance(value, float):
+        # Stored floats went through float32 properties.
+        return abs(current - value) <= 1e-6 * max(1.0, abs(value))
+    return current == value
+
+def apply_preset(preset):
+    # Sets preset values in order, skipping those already at their
+    # target value so unchanged properties don't trigger RNA updates.
+    # Returns (changed, failed) paths.
+    targets = {}
+    changed = []
+    failed = []
+    for path, value in preset['values']:
+        name, attr = path.split('.', 1)
+        try:
+            if name not in targets:
+                targets[name] = resolve_data_path(preset['defines'][name])
+            obj = targets[name]
+            if preset_value_equal(getattr(obj, attr), value):
+                continue
+            setattr(obj, attr, value)
+            profile_count('properties_set')
+            changed.append(path)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            failed.append(path)
+
+    return changed, failed
+
+def find_presets(name, preset_subdir):
+    # Preset files of both formats whose display name is name.
+    return [os.path.join(directory, f)
+            for directory in bpy.utils.preset_paths(preset_subdir)
+            for f in list_preset_dir(directory)
+            if os.path.splitext(f)[1] in ('.json', '.py')
+            and bpy.path.display_name(f) == name]
+
+class OHA_AddPresetBase(AddPresetBase):
+    def execute(self, context):
+        # The preset menus are UI classes, not registered in background
+        # mode.
+        preset_menu_class = getattr(bpy.types, self.preset_menu, None)
+
+        if self.remove_active:
+            if preset_menu_class is None:
+                return {'CANCELLED'}
+            filepaths = find_presets(preset_menu_class.bl_label,
+                                     self.preset_subdir)
+            if not filepaths:
+                return {'CANCELLED'}
+            for filepath in filepaths:
+                try:
+                    os.remove(filepath)
+                except OSError as e:
+                    self.report({'WARNING'}, "Can't remove %s: %s"
+                                % (filepath, e))
+            invalidate_preset_listing(self.preset_subdir)
+            return {'FINISHED'}
+
+        if not self.name:
+            return {'FINISHED'}
+
+        filename = self.as_filename(self.name)
+        target_path = bpy.utils.user_resource(
+            'SCRIPTS', os.path.join("presets", self.preset_subdir),
+            create=True)
+        if not target_path:
+            self.report({'WARNING'}, "Failed to create presets path")
+            return {'CANCELLED'}
+
+        write_preset(os.path.join(target_path, filename + '.json'),
+                     read_preset_values(self.preset_defines,
+                                        self.preset_values))
+        if preset_menu_class is not None:
+            preset_menu_class.bl_label = bpy.path.display_name(filename)
+        invalidate_preset_listing(self.preset_subdir)
+
+        return {'FINISHED'}
+
+class RENDER_OT_oha_preset_apply(bpy.types.Operator):
+    """Apply a render or preview preset."""
+    bl_idname = 'render.oha_preset_apply'
+    bl_label = 'Apply Preset'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filepath = StringProperty(
+        subtype='FILE_PATH',
+        options={'SKIP_SAVE'})
+    menu_idname = StringProperty(
+        options={'SKIP_SAVE'})
+
+    def execute(self, context):
+        try:
+            preset = load_preset(self.filepath)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, "Can't read preset %s: %s"
+                        % (self.filepath, e))
+            return {'CANCELLED'}
+
+        preset_class = getattr(bpy.types, self.menu_idname, None)
+        if preset_class:
+            preset_class.bl_label = bpy.path.display_name(
+                os.path.basename(self.filepath))
+
+        changed, failed = apply_preset(preset)
+        if failed:
+            self.report({'WARNING'}, "Couldn't set %s" % ", ".join(failed))
+        return {'FINISHED'}
+
+class RENDER_OT_oha_preset_convert(bpy.types.Operator):
+    """Convert .py render and preview presets to the faster JSON presets."""
+    bl_idname = 'render.oha_preset_convert'
+    bl_label = 'Convert Presets'
+    bl_options = {'REGISTER'}
+
+    preset_subdirs = ('oha_render_qc', 'oha_preview')
+
+    def execute(self, context):
+        count = 0
+        for preset_subdir in self.preset_subdirs:
+            for directory in bpy.utils.preset_paths(preset_subdir):
+                for f in list_preset_dir(directory):
+                    stem, ext = os.path.splitext(f)
+                    if ext != '.py':
+                        continue
+                    filepath = os.path.join(directory, f)
+                    try:
+                        write_preset(os.path.join(directory, stem + '.json'),
+                                     convert_py_preset(filepath))
+                    except (OSError, SyntaxError, ValueError) as e:
+                        self.report({'WARNING'}, "Can't convert %s: %s"
+                                    % (filepath, e))
+                        continue
+                    count += 1
+            invalidate_preset_listing(preset_subdir)
+
+        self.report({'INFO'}, "Converted %d presets" % count)
+        return {'FINISHED'}
+
+class RENDER_OT_oha_render_qc_preset_add(OHA_AddPresetBase, bpy.types.Operator):
     """Add a new preset containing all indicated settings."""
     bl_idname = 'render.oha_render_qc_preset_add'
     bl_label = 'Add Render QC Preset'
@@ -454,7 +3186,7 @@ class RENDER_OT_oha_render_qc_preset_add(AddPresetBase, bpy.types.Operator):
             name = name.replace(char, '_')
         return name.strip()
 
-class RENDER_OT_oha_preview_preset_add(AddPresetBase, bpy.types.Operator):
+class RENDER_OT_oha_preview_preset_add(OHA_AddPresetBase, bpy.types.Operator):
     bl_idname = 'render.oha_preview_preset_add'
     bl_label = 'Add Preview Preset'
     bl_options = {'REGISTER', 'UNDO'}
@@ -515,6 +3247,127 @@ class RENDER_OT_oha_preview_preset_add(AddPresetBase, bpy.types.Operator):
             self.dump_settings(context)
         return super().invoke(context, event)
 
+def batch_preset_items(self, context):
+    items = []
+    for menu, preset_subdir in (('QC', 'oha_render_qc'),
+                                ('Preview', 'oha_preview')):
+        for directory in bpy.utils.preset_paths(preset_subdir):
+            for f in list_preset_dir(directory):
+                if os.path.splitext(f)[1] in ('.json', '.py'):
+                    filepath = os.path.join(directory, f)
+                    items.append((filepath, "%s: %s"
+                                  % (menu, bpy.path.display_name(f)),
+                                  filepath))
+    # Enum items must stay referenced while the UI uses them.
+    batch_preset_items.items = items or [('', 'No Presets', '')]
+    return batch_preset_items.items
+
+class RENDER_OT_oha_batch_apply_preset(bpy.types.Operator):
+    """Apply a preset to many .blend files in parallel background Blender processes, saving each."""
+    bl_idname = 'render.oha_batch_apply_preset'
+    bl_label = 'Batch Apply Preset'
+    bl_options = {'REGISTER'}
+
+    files = CollectionProperty(
+        name="File Path",
+        type=bpy.types.OperatorFileListElement)
+    directory = StringProperty(
+        subtype='DIR_PATH')
+    filter_blender = BoolProperty(
+        default=True,
+        options={'HIDDEN'})
+    filter_folder = BoolProperty(
+        default=True,
+        options={'HIDDEN'})
+
+    preset = EnumProperty(
+        name="Preset",
+        items=batch_preset_items)
+    workers = IntProperty(
+        name="Processes",
+        description="Number of Blender processes running at once.",
+        default=max(1, (os.cpu_count() or 2) // 2),
+        min=1, max=64)
+    render_preview = BoolProperty(
+        name="Render Preview",
+        description="Also render the OpenGL preview, workers then open a window.",
+        default=False)
+    report_path = StringProperty(
+        name="Report",
+        description="Summary report file, defaults to oha_batch_report.json in the chosen folder.",
+        subtype='FILE_PATH')
+
+    _timer = None
+    pool = None
+    results = []
+    temp_dir = ''
+
+    def blend_files(self):
+        directory = bpy.path.abspath(self.directory)
+        names = [f.name for f in self.files if f.name.endswith('.blend')]
+        if names:
+            return [os.path.join(directory, name) for name in names]
+        return scan_files(directory, 0)
+
+    def finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+        report_path = bpy.path.abspath(self.report_path)\
+            or os.path.join(bpy.path.abspath(self.directory),
+                            'oha_batch_report.json')
+        report = batch_report(self.preset, self.results, report_path)
+        return report, report_path
+
+    def cancel(self, context):
+        self.pool.cancel()
+        self.finish(context)
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancel(context)
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        for (blendfile, job_report), returncode, output in self.pool.poll():
+            self.results.append(batch_preset_result(blendfile, returncode,
+                                                    output, job_report))
+        context.window_manager.progress_update(len(self.results))
+        if not self.pool.done:
+            return {'PASS_THROUGH'}
+
+        report, report_path = self.finish(context)
+        self.report({'WARNING'} if report['errors'] else {'INFO'},
+                    "%d files, %d errors, report in %s"
+                    % (report['files'], report['errors'], report_path))
+        return {'FINISHED'}
+
+    def execute(self, context):
+        if not self.preset:
+            self.report({'ERROR'}, "No preset chosen")
+            return {'CANCELLED'}
+        blendfiles = self.blend_files()
+        if not blendfiles:
+            return {'CANCELLED'}
+
+        self.results = []
+        self.temp_dir = tempfile.mkdtemp(prefix='oha_batch_')
+        self.pool = batch_preset_pool(self.preset, blendfiles, self.workers,
+                                      self.render_preview, self.temp_dir)
+
+        wm = context.window_manager
+        wm.progress_begin(0, len(blendfiles))
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
 # Uses bpy.ops.nla.bake as starting point.
 class GRAPH_OT_oha_fcurve_bake_action(bpy.types.Operator):
     """Bake object/pose loc/scale/rotation animation to a new action"""
@@ -522,6 +3375,16 @@ class GRAPH_OT_oha_fcurve_bake_action(bpy.types.Operator):
     bl_label = 'Bake Action'
     bl_options = {'REGISTER', 'UNDO'}
 
+    mode = EnumProperty(
+        name="Mode",
+        description="What to bake",
+        items=[('CYCLES', 'Cycle Modifiers',
+                'Extend cycle modifiers of the active action into keys'),
+               ('NLA', 'Flatten NLA',
+                'Evaluate the NLA stack into a single new action')],
+        default='CYCLES',
+        )
+
     frame_start = IntProperty(
         name="Start Frame",
         description="Start frame for baking",
@@ -548,6 +3411,20 @@ class GRAPH_OT_oha_fcurve_bake_action(bpy.types.Operator):
         default=False,
         )
 
+    mute_tracks = BoolProperty(
+        name="Mute NLA Tracks",
+        description="Mute the flattened NLA tracks, so only the new"
+        " action plays",
+        default=True,
+        )
+
+    clean_static = BoolProperty(
+        name="Clean Static Channels",
+        description="Afterwards, remove channels at rest and collapse"
+        " other unchanging channels to one key",
+        default=False,
+        )
+
     @classmethod
     def poll(self, context):
         return context.active_object != None\
@@ -555,19 +3432,47 @@ class GRAPH_OT_oha_fcurve_bake_action(bpy.types.Operator):
 
     def execute(self, context):
         obj = context.active_object
-        action = bake_action(obj,
-                             self.frame_start,
-                             self.frame_end,
-                             only_selected=self.only_selected\
-                                 if obj.type == 'ARMATURE'\
-                                 else False,
-                             only_visible=self.only_visible)
+        only_selected = self.only_selected if obj.type == 'ARMATURE'\
+            else False
+        # Cleaning only touches the curves just baked. The whole new
+        # action when flattening, the filtered cycled curves otherwise.
+        baked = None
+        if self.mode == 'NLA':
+            action = flatten_nla(obj, self.frame_start, self.frame_end,
+                                 mute_tracks=self.mute_tracks)
+        elif obj.animation_data.action != None:
+            baked = [(fc.data_path, fc.array_index) for fc
+                     in bake_action_fcurves(obj, only_selected,
+                                            self.only_visible)
+                     if len(fc.modifiers) == 1
+                     and fc.modifiers[0].type == 'CYCLES']
+            action = bake_action(obj,
+                                 self.frame_start,
+                                 self.frame_end,
+                                 only_selected=only_selected,
+                                 only_visible=self.only_visible)
+        else:
+            action = None
 
         if action is None:
             self.report({'INFO'}, "Nothing to bake")
             return {'CANCELLED'}
 
-        context.area.tag_redraw()
+        if self.clean_static:
+            fcurves = None
+            if baked != None:
+                by_path = fcurves_by_path(action)
+                fcurves = [by_path[key] for key in baked if key in by_path]
+            removed, collapsed, dropped = clean_static_fcurves(
+                action, fcurves=fcurves)
+            self.report({'INFO'}, "Baked %s, %d channels removed, %d"
+                        " collapsed, %d keys dropped"
+                        % (action.name, removed, collapsed, dropped))
+        elif self.mode == 'NLA':
+            self.report({'INFO'}, "Flattened NLA into %s" % action.name)
+
+        if context.area:
+            context.area.tag_redraw()
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -662,12 +3567,14 @@ class GRAPH_OT_oha_fcurve_add_cycle_modifier(bpy.types.Operator):
                     break
             if not cm:
                 cm = fcurve.modifiers.new(type = 'CYCLES')
+            profile_count('fcurves_touched')
             cm.mode_before = self.mode_before
             cm.mode_after = self.mode_after
             cm.cycles_before = self.cycles_before
             cm.cycles_after = self.cycles_after
 
-        context.area.tag_redraw()
+        if context.area:
+            context.area.tag_redraw()
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -722,19 +3629,49 @@ class GRAPH_OT_oha_fcurve_remove_cycle_modifier(bpy.types.Operator):
             for m in fcurve.modifiers:
                 if m.type == 'CYCLES':
                     fcurve.modifiers.remove(m)
+                    profile_count('fcurves_touched')
 
-        context.area.tag_redraw()
+        if context.area:
+            context.area.tag_redraw()
         return {'FINISHED'}
 
     def invoke(self, context, event):
         return context.window_manager.invoke_props_dialog(self)
 
-class VIEW3D_OT_oha_object_snap_to_prev_keyframe(bpy.types.Operator):
-    """Snap active object/bone to selected object."""
-    bl_idname = 'object.oha_snap_to_prev_keyframe'
-    bl_label = 'Snap to Previous Keyframe'
+class GRAPH_OT_oha_check_cycle_seams(bpy.types.Operator):
+    """Check cycled f-curves for value and tangent breaks where the cycle wraps"""
+    bl_idname = 'graph.oha_check_cycle_seams'
+    bl_label = 'Check Cycle Seams'
     bl_options = {'REGISTER', 'UNDO'}
 
+    fix = BoolProperty(
+        name="Fix",
+        description="Match the last key and seam handles to the first key",
+        default=False,
+        )
+
+    value_tolerance = FloatProperty(
+        name="Value Tolerance",
+        min=0.0, default=0.0001, precision=5,
+        )
+
+    slope_tolerance = FloatProperty(
+        name="Slope Tolerance",
+        min=0.0, default=0.001, precision=5,
+        )
+
+    only_selected = BoolProperty(
+        name="Only Selected",
+        description="Only check selected bones",
+        default=False,
+        )
+
+    only_visible = BoolProperty(
+        name="Only Visible",
+        description="Only check visible f-curve channels",
+        default=False,
+        )
+
     @classmethod
     def poll(self, context):
         return context.active_object != None\
@@ -742,49 +3679,450 @@ class VIEW3D_OT_oha_object_snap_to_prev_keyframe(bpy.types.Operator):
             and context.active_object.animation_data.action != None
 
     def execute(self, context):
-        bone = context.active_pose_bone
-        action = context.object.animation_data.action
-        fcurves = [str(c) for c in action.fcurves if bone.name in c.data_path]
-        print("\n".join(fcurves))
-        print('*' * 50)
+        obj = context.active_object
+        action = obj.animation_data.action
+        bones = set(b.name for b in obj.data.bones if b.select)\
+            if obj.type == 'ARMATURE' and self.only_selected\
+            else None
+
+        fcurves = [fc for fc in action.fcurves
+                   if not (self.only_visible and fc.hide)
+                   and (bones is None
+                        or fcurve_bone_name(fc.data_path) in bones)]
+        seams = check_cycle_seams(fcurves, self.value_tolerance,
+                                  self.slope_tolerance, fix=self.fix)
+
+        lines = ["%s[%d]: %s" % (fc.data_path, fc.array_index,
+                                 ", ".join(problems))
+                 for fc, problems in seams]
+        summary = "%s: %d cycled curves with seam problems%s" \
+            % (action.name, len(seams),
+               ", fixed" if self.fix and seams else "")
+        text = bpy.data.texts.get("oha_cycle_seams")
+        if text is None:
+            text = bpy.data.texts.new("oha_cycle_seams")
+        text.from_string("\n".join([summary] + lines) + "\n")
+
+        self.report({'WARNING'} if seams and not self.fix else {'INFO'},
+                    summary)
+        if context.area:
+            context.area.tag_redraw()
         return {'FINISHED'}
 
-class VIEW3D_OT_oha_object_snap_to_object(bpy.types.Operator):
-    """Snap active object/bone to selected object/bone."""
-    bl_idname = 'object.oha_snap_to_object'
-    bl_label = 'Snap to Object'
+class GRAPH_OT_oha_clean_static_fcurves(bpy.types.Operator):
+    """Remove f-curves at rest and collapse f-curves whose value never changes"""
+    bl_idname = 'graph.oha_clean_static_fcurves'
+    bl_label = 'Clean Static Channels'
     bl_options = {'REGISTER', 'UNDO'}
 
-    snap_rotation = BoolProperty(
-        name="Rotation",
-        description="Also adjusting rotation to reference object.",
+    scope = EnumProperty(
+        name="Actions",
+        items=[('ACTIVE', 'Active Action', ''),
+               ('SELECTED', 'Selected Objects', 'Active actions of all'
+                ' selected objects'),
+               ('ALL', 'All Actions', 'Every action in the file')],
+        default='ACTIVE',
+        )
+
+    tolerance = FloatProperty(
+        name="Tolerance",
+        description="Largest value change still considered static",
+        min=0.0, default=0.00001, precision=6,
+        )
+
+    remove_rest = BoolProperty(
+        name="Remove Rest Channels",
+        description="Remove transform channels that stay at their rest"
+        " value instead of keeping one key",
         default=True,
         )
 
-    snap_scale = BoolProperty(
+    @classmethod
+    def poll(self, context):
+        return context.active_object != None\
+            and context.active_object.animation_data != None\
+            and context.active_object.animation_data.action != None
+
+    def execute(self, context):
+        if self.scope == 'ALL':
+            actions = set(bpy.data.actions)
+        elif self.scope == 'SELECTED':
+            actions = set(o.animation_data.action
+                          for o in context.selected_objects
+                          if o.animation_data != None
+                          and o.animation_data.action != None)
+        else:
+            actions = set([context.active_object.animation_data.action])
+
+        removed = collapsed = dropped = 0
+        for action in actions:
+            r, c, d = clean_static_fcurves(action, self.tolerance,
+                                           self.remove_rest)
+            removed += r
+            collapsed += c
+            dropped += d
+
+        self.report({'INFO'}, "%d channels removed, %d collapsed, %d keys"
+                    " dropped" % (removed, collapsed, dropped))
+        if context.area:
+            context.area.tag_redraw()
+        return {'FINISHED'}
+
+class GRAPH_OT_oha_retime(bpy.types.Operator):
+    """Offset, scale or remap key timing across one or many actions"""
+    bl_idname = 'graph.oha_retime'
+    bl_label = 'Retime'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    mode = EnumProperty(
+        name="Mode",
+        items=[('OFFSET', 'Offset', 'Shift keys by a number of frames'),
+               ('SCALE', 'Scale', 'Scale key timing around a pivot frame'),
+               ('REMAP', 'Remap', 'Map a source frame range onto a target'
+                ' range')],
+        default='OFFSET',
+        )
+
+    scope = EnumProperty(
+        name="Actions",
+        items=[('ACTIVE', 'Active Action', ''),
+               ('SELECTED', 'Selected Objects', 'Active actions of all'
+                ' selected objects'),
+               ('ALL', 'All Actions', 'Every action in the file')],
+        default='ACTIVE',
+        )
+
+    offset = FloatProperty(
+        name="Offset",
+        description="Frames to shift keys by",
+        default=0.0,
+        )
+
+    scale = FloatProperty(
         name="Scale",
-        description="Also adjusting scale to reference object.",
-        default=False,
+        description="Timing scale factor",
+        min=0.001, default=1.0,
         )
 
-    snap_pbone_rotation_scale = BoolProperty(
-        name="Rotation + Scale",
-        description="Also adjusting rotation and scale to reference object.",
+    pivot = FloatProperty(
+        name="Pivot",
+        description="Frame kept in place when scaling",
+        default=1.0,
+        )
+
+    source_start = IntProperty(name="Source Start", default=1)
+    source_end = IntProperty(name="Source End", default=250)
+    target_start = IntProperty(name="Target Start", default=1)
+    target_end = IntProperty(name="Target End", default=250)
+
+    stagger = FloatProperty(
+        name="Stagger",
+        description="Extra offset per bone hierarchy level of the active"
+        " armature, for overlapping action",
+        default=0.0,
+        )
+
+    only_selected = BoolProperty(
+        name="Only Selected",
+        description="Only retime selected bones",
         default=False,
         )
 
     @classmethod
     def poll(self, context):
-        return len(context.selected_objects) == 2\
-            and context.mode in ['POSE', 'OBJECT']
+        return context.active_object != None\
+            and context.active_object.animation_data != None\
+            and context.active_object.animation_data.action != None
 
     def draw(self, context):
         layout = self.layout
-
-        row = layout.row(align=True)
-        if context.mode != 'POSE':
-            row.prop(self, "snap_rotation", toggle=True)
-            row.prop(self, "snap_scale", toggle=True)
+        layout.row().prop(self, 'mode', expand=True)
+        layout.prop(self, 'scope')
+
+        if self.mode == 'OFFSET':
+            layout.prop(self, 'offset')
+        elif self.mode == 'SCALE':
+            row = layout.row(align=True)
+            row.prop(self, 'scale')
+            row.prop(self, 'pivot')
+        else:
+            row = layout.row(align=True)
+            row.prop(self, 'source_start')
+            row.prop(self, 'source_end')
+            row = layout.row(align=True)
+            row.prop(self, 'target_start')
+            row.prop(self, 'target_end')
+
+        row = layout.row()
+        row.prop(self, 'stagger')
+        row.prop(self, 'only_selected')
+
+    def execute(self, context):
+        obj = context.active_object
+
+        if self.mode == 'OFFSET':
+            scale, offset = 1.0, self.offset
+        elif self.mode == 'SCALE':
+            scale, offset = self.scale, self.pivot * (1.0 - self.scale)
+        else:
+            if self.source_end <= self.source_start\
+                    or self.target_end <= self.target_start:
+                self.report({'ERROR'}, "Empty frame range")
+                return {'CANCELLED'}
+            scale = (self.target_end - self.target_start)\
+                / (self.source_end - self.source_start)
+            offset = self.target_start - self.source_start * scale
+
+        if self.scope == 'ALL':
+            actions = list(bpy.data.actions)
+        elif self.scope == 'SELECTED':
+            actions = [o.animation_data.action
+                       for o in context.selected_objects
+                       if o.animation_data != None
+                       and o.animation_data.action != None]
+        else:
+            actions = [obj.animation_data.action]
+
+        bones = None
+        bone_offsets = {}
+        if obj.type == 'ARMATURE':
+            if self.only_selected:
+                bones = set(b.name for b in obj.data.bones if b.select)
+            if self.stagger:
+                bone_offsets = dict(
+                    (b.name, self.stagger * len(b.parent_recursive))
+                    for b in obj.data.bones)
+
+        moved = 0
+        for action in set(actions):
+            fcurves = [fc for fc in action.fcurves
+                       if bones is None
+                       or fcurve_bone_name(fc.data_path) in bones]
+            moved += retime_fcurves(fcurves, scale, offset, bone_offsets)
+
+        self.report({'INFO'}, "%d keys in %d actions retimed"
+                    % (moved, len(set(actions))))
+        if context.area:
+            context.area.tag_redraw()
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        self.pivot = context.scene.frame_current
+        self.source_start = self.target_start = context.scene.frame_start
+        self.source_end = self.target_end = context.scene.frame_end
+
+        return context.window_manager.invoke_props_dialog(self)
+
+class GRAPH_OT_oha_pose_cache_export(bpy.types.Operator):
+    """Write the active action's f-curves to a pose cache file"""
+    bl_idname = 'graph.oha_pose_cache_export'
+    bl_label = 'Export Pose Cache'
+    bl_options = {'REGISTER'}
+
+    filepath = StringProperty(
+        subtype='FILE_PATH')
+    filter_glob = StringProperty(
+        default='*.ohapose',
+        options={'HIDDEN'})
+
+    @classmethod
+    def poll(self, context):
+        return context.active_object != None\
+            and context.active_object.animation_data != None\
+            and context.active_object.animation_data.action != None
+
+    def execute(self, context):
+        action = context.active_object.animation_data.action
+        filepath = bpy.path.ensure_ext(bpy.path.abspath(self.filepath),
+                                       '.ohapose')
+        try:
+            keys = write_pose_cache(filepath, action)
+        except OSError as e:
+            self.report({'ERROR'}, "Can't write %s: %s" % (filepath, e))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "%d curves, %d keys written"
+                    % (len(action.fcurves), keys))
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        action = context.active_object.animation_data.action
+        self.filepath = os.path.join(
+            os.path.dirname(bpy.data.filepath),
+            bpy.path.clean_name(action.name) + '.ohapose')
+
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class GRAPH_OT_oha_pose_cache_import(bpy.types.Operator):
+    """Read a pose cache file into a new action"""
+    bl_idname = 'graph.oha_pose_cache_import'
+    bl_label = 'Import Pose Cache'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filepath = StringProperty(
+        subtype='FILE_PATH')
+    filter_glob = StringProperty(
+        default='*.ohapose',
+        options={'HIDDEN'})
+
+    assign = BoolProperty(
+        name="Assign to Active",
+        description="Make the imported action the active object's action",
+        default=True,
+        )
+
+    def execute(self, context):
+        filepath = bpy.path.abspath(self.filepath)
+        try:
+            action = read_pose_cache(filepath)
+        except (OSError, ValueError, KeyError) as e:
+            self.report({'ERROR'}, "Can't read %s: %s" % (filepath, e))
+            return {'CANCELLED'}
+
+        obj = context.active_object
+        if self.assign and obj != None:
+            if obj.animation_data is None:
+                obj.animation_data_create()
+            obj.animation_data.action = action
+
+        self.report({'INFO'}, "Imported %s" % action.name)
+        if context.area:
+            context.area.tag_redraw()
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class VIEW3D_OT_oha_object_snap_to_prev_keyframe(bpy.types.Operator):
+    """Snap active object/bone to selected object."""
+    bl_idname = 'object.oha_snap_to_prev_keyframe'
+    bl_label = 'Snap to Previous Keyframe'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(self, context):
+        return context.active_object != None\
+            and context.active_object.animation_data != None\
+            and context.active_object.animation_data.action != None
+
+    def execute(self, context):
+        bone = context.active_pose_bone
+        action = context.object.animation_data.action
+        fcurves = [str(c) for c in action.fcurves if bone.name in c.data_path]
+        print("\n".join(fcurves))
+        print('*' * 50)
+        return {'FINISHED'}
+
+class VIEW3D_OT_oha_pose_visual_bake(bpy.types.Operator):
+    """Bake constraint-driven motion of selected bones into keys."""
+    bl_idname = 'pose.oha_visual_bake'
+    bl_label = 'Visual Bake'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    frame_start = IntProperty(
+        name="Start Frame",
+        description="Start frame for baking",
+        min=0, max=300000,
+        default=1,
+        )
+
+    frame_end = IntProperty(
+        name="End Frame",
+        description="End frame for baking",
+        min=1, max=300000,
+        default=250,
+        )
+
+    step = IntProperty(
+        name="Frame Step",
+        description="Frames between baked keys",
+        min=1, max=120,
+        default=1,
+        )
+
+    only_child_of = BoolProperty(
+        name="Only Child Of",
+        description="Only bake bones driven by a fully weighted Child Of constraint",
+        default=False,
+        )
+
+    mute_constraints = BoolProperty(
+        name="Mute Constraints",
+        description="Mute the baked bones' constraints afterwards",
+        default=True,
+        )
+
+    @classmethod
+    def poll(self, context):
+        return context.active_object != None\
+            and context.active_object.type == 'ARMATURE'\
+            and context.mode == 'POSE'
+
+    def execute(self, context):
+        obj = context.active_object
+        pbones = [pb for pb in obj.pose.bones if pb.bone.select]
+        if self.only_child_of:
+            pbones = [pb for pb in pbones
+                      if get_pbone_parent_matrix(pb)[2] != None]
+
+        if not pbones:
+            self.report({'INFO'}, "Nothing to bake")
+            return {'CANCELLED'}
+
+        visual_bake_pose(context, obj, pbones,
+                         self.frame_start, self.frame_end, self.step)
+
+        if self.mute_constraints:
+            for pb in pbones:
+                for c in pb.constraints:
+                    c.mute = True
+
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        self.frame_start = context.scene.frame_start
+        self.frame_end = context.scene.frame_end
+
+        return context.window_manager.invoke_props_dialog(self)
+
+class VIEW3D_OT_oha_object_snap_to_object(bpy.types.Operator):
+    """Snap active object/bone to selected object/bone."""
+    bl_idname = 'object.oha_snap_to_object'
+    bl_label = 'Snap to Object'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    snap_rotation = BoolProperty(
+        name="Rotation",
+        description="Also adjusting rotation to reference object.",
+        default=True,
+        )
+
+    snap_scale = BoolProperty(
+        name="Scale",
+        description="Also adjusting scale to reference object.",
+        default=False,
+        )
+
+    snap_pbone_rotation_scale = BoolProperty(
+        name="Rotation + Scale",
+        description="Also adjusting rotation and scale to reference object.",
+        default=False,
+        )
+
+    @classmethod
+    def poll(self, context):
+        return len(context.selected_objects) == 2\
+            and context.mode in ['POSE', 'OBJECT']
+
+    def draw(self, context):
+        layout = self.layout
+
+        row = layout.row(align=True)
+        if context.mode != 'POSE':
+            row.prop(self, "snap_rotation", toggle=True)
+            row.prop(self, "snap_scale", toggle=True)
         else:
             row.prop(self, "snap_pbone_rotation_scale", toggle=True)
 
@@ -875,24 +4213,44 @@ class SEQUENCER_OT_oha_movie_strip_add(bpy.types.Operator):
         description='Position all movie strips in the same channel, one after the other.',
         default=True
         )
+    build_proxies = EnumProperty(
+        name='Build Proxies',
+        description='Build proxies for the imported strips in the background.',
+        items=[('NONE', 'No Proxies', ''),
+               ('25', '25%', ''),
+               ('50', '50%', ''),
+               ],
+        default='NONE')
+    build_timecode = BoolProperty(
+        name='Timecode Index',
+        description='Also build Record Run timecode indexes after the proxies.',
+        default=False)
 
     def execute(self, context):
-        frame_start = self.frame_start
-        channel = self.channel
-
-        for f in self.files:
-            if f.name == '': continue
-
-            filepath = os.path.join(self.directory, f.name)
-            bpy.ops.sequencer.movie_strip_add(
+        names = [f.name for f in self.files if f.name != '']
+        filepaths = [os.path.join(self.directory, name) for name in names]
+        probes = probe_movies(filepaths)
+
+        # Without consecutive placement every file starts at the same
+        # frame, so each one goes two channels (video and sound) higher.
+        entries = []
+        for i, (name, filepath) in enumerate(zip(names, filepaths)):
+            consecutive = self.consecutive and i > 0
+            entries.append(dict(
                 filepath = filepath,
-                frame_start = frame_start,
-                channel = channel)
-            bpy.ops.sequencer.meta_make()
-            active_strip = context.scene.sequence_editor.active_strip
-            active_strip.name = '%.50s_group' % f.name
-            if self.consecutive:
-                frame_start = active_strip.frame_final_end
+                name = name,
+                channel = self.channel if self.consecutive\
+                    else self.channel + 2 * i,
+                frame_start = None if consecutive else self.frame_start))
+
+        metas = add_grouped_movie_strips(context, entries, probes)
+
+        if self.build_proxies != 'NONE':
+            for meta in metas:
+                meta.select = True
+            bpy.ops.sequencer.oha_build_proxies(
+                'INVOKE_DEFAULT', proxy_size=self.build_proxies,
+                build_timecode=self.build_timecode)
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -901,6 +4259,252 @@ class SEQUENCER_OT_oha_movie_strip_add(bpy.types.Operator):
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
+class SEQUENCER_OT_oha_conform_edit_list(bpy.types.Operator):
+    """Place grouped movie strips from a CMX3600 EDL or CSV cut list."""
+    bl_idname = 'sequencer.oha_conform_edit_list'
+    bl_label = 'Conform Edit List'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filepath = StringProperty(
+        subtype='FILE_PATH')
+    filter_glob = StringProperty(
+        default='*.edl;*.csv',
+        options={'HIDDEN'})
+
+    media_directory = StringProperty(
+        name='Media Folder',
+        description='Folder searched for the referenced movie files, defaults to the edit list\'s folder.',
+        subtype='DIR_PATH')
+    channel = IntProperty(
+        name='Channel',
+        description='Channel for edit list channel 1.',
+        default=1,
+        min=1,max=32)
+    frame_start = IntProperty(
+        name='Start Frame',
+        description='Frame of the first recorded event.',
+        default=1)
+
+    movie_extensions = frozenset(['.avi', '.mov', '.mp4', '.mkv', '.mxf',
+                                  '.mpg', '.mpeg', '.ogv', '.dv', '.flv',
+                                  '.m4v', '.webm'])
+
+    def execute(self, context):
+        render = context.scene.render
+        fps = int(round(render.fps / render.fps_base))
+        filepath = bpy.path.abspath(self.filepath)
+
+        try:
+            if filepath.lower().endswith('.csv'):
+                events = parse_edit_csv(filepath, fps)
+            else:
+                events = parse_edl(filepath, fps)
+        except (OSError, ValueError, KeyError) as e:
+            self.report({'ERROR'}, "Can't read %s: %s" % (filepath, e))
+            return {'CANCELLED'}
+
+        directory = bpy.path.abspath(self.media_directory)\
+            or os.path.dirname(filepath)
+        resolved = resolve_media_files([e['file'] for e in events],
+                                       directory, self.movie_extensions)
+        missing = sorted(n for n, f in resolved.items() if f is None)
+
+        probes = probe_movies(set(f for f in resolved.values() if f))
+
+        # Source timecodes count from each clip's start timecode, read
+        # by ffprobe, else taken as the clip's earliest source in.
+        clip_starts = {}
+        for e in events:
+            f = resolved[e['file']]
+            if f is None or not e['timecode']:
+                continue
+            if f not in clip_starts:
+                probe = probes.get(f)
+                timecode = probe and probe['timecode']
+                try:
+                    clip_starts[f] = timecode_to_frames(timecode, fps)\
+                        if timecode else None
+                except ValueError:
+                    clip_starts[f] = None
+        for f, start in list(clip_starts.items()):
+            if start is None:
+                clip_starts[f] = min(e['source_in'] for e in events
+                                     if e['timecode']
+                                     and resolved[e['file']] == f)
+
+        # A strip is placed so the source in point lands on the record
+        # in frame, then trimmed to the source range. Each edit list
+        # channel takes two sequencer channels, video and sound.
+        entries = []
+        for e in events:
+            f = resolved[e['file']]
+            if f is None:
+                continue
+            source_in = e['source_in'] - clip_starts.get(f, 0)\
+                if e['timecode'] else e['source_in']
+            record_in = self.frame_start + e['record_in']
+            entries.append(dict(
+                filepath = f,
+                name = os.path.basename(f),
+                channel = self.channel + 2 * (e['channel'] - 1),
+                frame_start = record_in - source_in,
+                frame_final_start = record_in,
+                frame_final_end = record_in + e['source_out'] - e['source_in']))
+
+        add_grouped_movie_strips(context, entries, probes)
+
+        if missing:
+            self.report({'WARNING'}, "%d events placed, missing files: %s"
+                        % (len(entries), ", ".join(missing)))
+        else:
+            self.report({'INFO'}, "%d events placed" % len(entries))
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class SEQUENCER_OT_oha_build_proxies(bpy.types.Operator):
+    """Build proxies for selected movie strips, including those inside selected metastrips, in parallel ffmpeg processes."""
+    bl_idname = 'sequencer.oha_build_proxies'
+    bl_label = 'Build Proxies'
+    bl_options = {'REGISTER'}
+
+    proxy_size = EnumProperty(
+        name='Proxy Size',
+        items=[('25', '25%', ''),
+               ('50', '50%', ''),
+               ],
+        default='25')
+    build_timecode = BoolProperty(
+        name='Timecode Index',
+        description='Afterwards let Blender build the Record Run timecode index.',
+        default=True)
+    workers = IntProperty(
+        name='Processes',
+        description='Number of ffmpeg processes running at once.',
+        default=max(1, (os.cpu_count() or 2) // 2),
+        min=1, max=64)
+
+    _timer = None
+    pool = None
+    strips = {}
+    temp_dir = ''
+
+    @classmethod
+    def poll(self, context):
+        return context.scene.sequence_editor != None
+
+    def selected_movie_strips(self, context):
+        # Metastrips only have their direct children in .sequences,
+        # sequences_all is the editor's alone.
+        def movie_strips(sequences):
+            for strip in sequences:
+                if strip.type == 'MOVIE':
+                    yield strip
+                elif strip.type == 'META':
+                    yield from movie_strips(strip.sequences)
+
+        return list(movie_strips(s for s
+                                 in context.scene.sequence_editor.sequences
+                                 if s.select))
+
+    def finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+        if self.build_timecode and self.strips:
+            # Timecode indexes are Blender's own format; with overwrite
+            # off its proxy job only adds what's still missing.
+            for strip in context.scene.sequence_editor.sequences_all:
+                strip.select = strip.name in self.strips
+                if strip.name in self.strips:
+                    strip.proxy.use_overwrite = False
+                    strip.proxy.build_record_run = True
+            bpy.ops.sequencer.rebuild_proxy('INVOKE_DEFAULT')
+
+    def cancel(self, context):
+        self.pool.cancel()
+        self.strips = {}
+        self.finish(context)
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancel(context)
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        size = int(self.proxy_size)
+        sequences = context.scene.sequence_editor.sequences_all
+        for name, returncode, output in self.pool.poll():
+            strip = sequences.get(name)
+            directory, temp_path, proxy_path = self.strips[name]
+            if returncode == 0 and strip != None:
+                # Proxies are built in the temporary folder and only
+                # moved into the proxy directory once done, so failed
+                # or cancelled jobs leave nothing behind there.
+                try:
+                    os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+                    shutil.move(temp_path, proxy_path)
+                except OSError as e:
+                    returncode, output = -1, str(e)
+            if returncode != 0 or strip is None:
+                self.report({'WARNING'}, "Proxy of %s failed: %s"
+                            % (name, output.strip()))
+                # Its proxy settings are never enabled, so it's left out
+                # of the timecode pass.
+                self.strips.pop(name, None)
+                continue
+            strip.use_proxy = True
+            strip.use_proxy_custom_directory = True
+            strip.proxy.directory = directory
+            setattr(strip.proxy, 'build_%d' % size, True)
+
+        pool = self.pool
+        context.window_manager.progress_update(
+            pool.total - len(pool.queue) - len(pool.running))
+        if not pool.done:
+            return {'PASS_THROUGH'}
+
+        self.finish(context)
+        self.report({'INFO'}, "Built %d of %d proxies"
+                    % (len(self.strips), pool.total))
+        return {'FINISHED'}
+
+    def execute(self, context):
+        size = int(self.proxy_size)
+        strips = self.selected_movie_strips(context)
+        if not strips:
+            return {'CANCELLED'}
+        if shutil.which('ffmpeg') is None:
+            self.report({'ERROR'}, "ffmpeg not found")
+            return {'CANCELLED'}
+
+        self.pool = ProcessPool(self.workers)
+        self.strips = {}
+        self.temp_dir = tempfile.mkdtemp(prefix='oha_proxy_')
+        for i, strip in enumerate(strips):
+            filepath = bpy.path.abspath(strip.filepath)
+            directory = os.path.join(os.path.dirname(filepath), 'BL_proxy')
+            temp_path = os.path.join(self.temp_dir, '%d.avi' % i)
+            self.strips[strip.name] = (directory, temp_path,
+                                       proxy_filepath(filepath, size,
+                                                      directory))
+            self.pool.add(strip.name,
+                          proxy_build_args(filepath, size, temp_path))
+
+        wm = context.window_manager
+        wm.progress_begin(0, self.pool.total)
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
 class SCENE_OT_oha_quicklink_populate(bpy.types.Operator):
     """Populate list of .blend files within specified root folder."""
     bl_idname = 'scene.oha_quicklink_populate'
@@ -908,9 +4512,12 @@ class SCENE_OT_oha_quicklink_populate(bpy.types.Operator):
     bl_options = {'REGISTER'}
 
     root_folder = ''
-    folder_list = []
-    folder_list_index = 0
-    cache = {}
+    cache_key = ''
+    file_list = []
+    file_list_index = 0
+    # Key of the listing currently in OHA_QuickLink_Props.groups, shared
+    # like that list, to skip rereading it from the cache.
+    loaded_key = None
 
     use_cache = BoolProperty(default=True, options={'HIDDEN'})
 
@@ -922,84 +4529,101 @@ class SCENE_OT_oha_quicklink_populate(bpy.types.Operator):
     def _populate0(self, context):
         props = context.scene.oha.quicklink_props
 
-        folder = self.folder_list[self.folder_list_index]
-        self.folder_list_index += 1
-        
-        file_list = [os.path.join(folder, f)
-                     for f in os.listdir(folder)
-                     if os.path.isfile(os.path.join(folder, f))
-                     and f.endswith('.blend')]
+        f = self.file_list[self.file_list_index]
+        self.file_list_index += 1
+        profile_count('libraries_opened')
+
+        with bpy.data.libraries.load(f) as (data_from, data_to):
+            for g in data_from.groups:
+                props.groups.append(g, f)
 
-        for f in file_list:
-            with bpy.data.libraries.load(f) as (data_from, data_to):
-                for g in data_from.groups:
-                    props.groups.append((g, f))
+        if props.show_previews:
+            quicklink_preview_paths[f] = quicklink_thumbnail_path(
+                f, create=True)
 
     def _populate1(self, context):
         props = context.scene.oha.quicklink_props
 
-        if self.root_folder in self.cache.keys():
-            props.groups = self.cache[self.root_folder]
-
+        props.groups.prune_selected()
+        shown, props.groups_matched = props.groups.filter(
+            props.list_filter, props.max_items)
+        selected = props.groups.selected
         props.groups_collection.clear()
-        for g, f in props.groups:
-            if props.list_filter.lower() in str.lower(g+f):
-                item = props.groups_collection.add()
-                item.name = g
-                item.file_path = f
+        for g, f in shown:
+            item = props.groups_collection.add()
+            item.name = g
+            item.file_path = f
+            if (g, f) in selected:
+                item.selected = True
+
+    def _init_cache(self, context):
+        props = context.scene.oha.quicklink_props
+        self.root_folder = bpy.path.abspath(props.root_folder)
+        # Scan settings are part of the key, a cached listing made
+        # with other patterns or depth doesn't apply.
+        self.cache_key = "|".join([self.root_folder, str(props.scan_depth),
+                                   props.include_patterns,
+                                   props.exclude_patterns])
+
+    def _load_cache(self, context):
+        props = context.scene.oha.quicklink_props
+
+        if SCENE_OT_oha_quicklink_populate.loaded_key == self.cache_key:
+            return True
+        with QuickLinkCache(quicklink_cache_db()) as cache:
+            groups = cache.get(self.cache_key)
+        if groups is None:
+            return False
+
+        props.groups.replace(groups)
+        SCENE_OT_oha_quicklink_populate.loaded_key = self.cache_key
+        return True
 
     def modal(self, context, event):
         props = context.scene.oha.quicklink_props
 
-        if self.folder_list_index < len(self.folder_list):
+        if self.file_list_index < len(self.file_list):
             self._populate0(context)
             return {'PASS_THROUGH'}
 
-        self.cache[self.root_folder] = props.groups
-        while len(self.cache) > 10:
-            self.cache.pop(list(self.cache.keys())[0])
-        self.cache.sync()
+        with QuickLinkCache(quicklink_cache_db()) as cache:
+            cache.put(self.cache_key, props.groups)
+        if cache.error != None:
+            self.report({'WARNING'}, "QuickLink cache not saved: %s"
+                        % cache.error)
+        SCENE_OT_oha_quicklink_populate.loaded_key = self.cache_key
         self._populate1(context)
 
         return {'FINISHED'}
 
     def execute(self, context):
-        props = context.scene.oha.quicklink_props
-        self.root_folder = bpy.path.abspath(props.root_folder)
-        self.cache = shelve.open(QUICKLINK_CACHE)
+        self._init_cache(context)
+        self._load_cache(context)
         self._populate1(context)
 
         return {'FINISHED'}
 
     def invoke(self, context, event):
-        def listdir(directory):
-            return [os.path.join(directory, f)
-                    for f in os.listdir(directory)
-                    if os.path.isdir(os.path.join(directory, f))
-                    and not f.startswith('.')
-                    and os.access(os.path.join(directory, f), os.R_OK)]
         wm = context.window_manager
         props = context.scene.oha.quicklink_props
-        self.root_folder = bpy.path.abspath(props.root_folder)
-        self.cache = shelve.open(QUICKLINK_CACHE)
+        self._init_cache(context)
 
-        if self.use_cache and self.root_folder in self.cache.keys():
+        if self.use_cache and self._load_cache(context):
             self._populate1(context)
             return {'FINISHED'}
 
-        if not os.access(self.root_folder, os.R_OK):
+        if not os.path.isdir(self.root_folder):
             return {'CANCELLED'}
 
         props.groups.clear()
-        self.folder_list.clear()
+        SCENE_OT_oha_quicklink_populate.loaded_key = None
+        self.file_list = scan_files(
+            self.root_folder, props.scan_depth,
+            include=split_patterns(props.include_patterns),
+            exclude=split_patterns(props.exclude_patterns),
+            min_depth=1)
+        self.file_list_index = 0
 
-        folder0_list = listdir(self.root_folder)
-
-        for folder in folder0_list:
-            self.folder_list.append(folder)
-            self.folder_list.extend(listdir(folder))
-        self.folder_list.sort()
-        
         wm.modal_handler_add(self)
         return {'RUNNING_MODAL'}
     
@@ -1029,7 +4653,10 @@ class SCENE_OT_oha_quicklink_makeproxy(bpy.types.Operator):
             file_item.file_path if self.file_path == ''\
                 else self.file_path)
 
-        gd = dict(fullpath = file_item.file_path, basepath = group_basename,
+        file_path = file_item.file_path if self.file_path == ''\
+            else self.file_path
+        gd = dict(fullpath = library_link_path(file_path),
+                  basepath = group_basename,
                   group = group_name, sep = os.sep)
 
         group_fpath = "%(fullpath)s%(sep)sGroup%(sep)s%(group)s" % gd
@@ -1046,6 +4673,10 @@ class SCENE_OT_oha_quicklink_makeproxy(bpy.types.Operator):
             instance_groups=self.make_instance,
             relative_path=True)
 
+        group = bpy.data.groups.get(group_name)
+        if group != None and group.library != None:
+            library_mark_source(group.library, file_path)
+
         if not (self.make_instance and self.make_proxy):
             return {'FINISHED'}
 
@@ -1060,6 +4691,63 @@ class SCENE_OT_oha_quicklink_makeproxy(bpy.types.Operator):
 
         return {'FINISHED'}
 
+class SCENE_OT_oha_quicklink_makeproxy_batch(bpy.types.Operator):
+    """Link all checked groups into the scene, opening each library once, and create proxies."""
+    bl_idname = 'scene.oha_quicklink_makeproxy_batch'
+    bl_label = 'Make Proxies'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    make_instance = BoolProperty(default=True, options={'HIDDEN', 'SKIP_SAVE'})
+    make_proxy = BoolProperty(default=True, options={'HIDDEN', 'SKIP_SAVE'})
+
+    @classmethod
+    def poll(self, context):
+        props = context.scene.oha.quicklink_props
+        return len(props.groups.selected) > 0
+
+    def execute(self, context):
+        props = context.scene.oha.quicklink_props
+        # Checked groups hidden by the current filter are linked too.
+        requests = props.groups.selected_groups()
+        if not requests:
+            return {'CANCELLED'}
+
+        for o in context.selected_objects:
+            o.select = False
+        failed_files = []
+        result = link_groups(context, requests,
+                             make_instance=self.make_instance,
+                             make_proxy=self.make_proxy,
+                             failed_files=failed_files)
+
+        summary = "Linked %d of %d groups" \
+            % (len([g for g, e in result if g]), len(requests))
+        if failed_files:
+            self.report({'WARNING'}, "%s, can't read %s"
+                        % (summary, ", ".join(failed_files)))
+        else:
+            self.report({'INFO'}, summary)
+        return {'FINISHED'}
+
+class SCENE_OT_oha_quicklink_select_all(bpy.types.Operator):
+    """Check or uncheck all listed groups for batch linking."""
+    bl_idname = 'scene.oha_quicklink_select_all'
+    bl_label = 'Select All Groups'
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(self, context):
+        props = context.scene.oha.quicklink_props
+        return len(props.groups_collection) > 0
+
+    def execute(self, context):
+        props = context.scene.oha.quicklink_props
+        select = not any(item.selected for item in props.groups_collection)
+        for item in props.groups_collection:
+            item.selected = select
+
+        return {'FINISHED'}
+
 class SCENE_OT_oha_reinstance_missing_groups(bpy.types.Operator):
     """Attempt to reinstance missing groups caused by broken file links."""
     bl_idname = 'scene.oha_reinstance_missing_groups'
@@ -1076,28 +4764,128 @@ class SCENE_OT_oha_reinstance_missing_groups(bpy.types.Operator):
         if not empty_objects:
             return {'CANCELLED'}
 
-        for empty in empty_objects:
-            matching_groups = [(g, f) for (g, f) in props.groups
-                               if empty.name.startswith(g)]
-            if not matching_groups:
+        index = GroupPrefixIndex(props.groups)
+        matches = [(empty, index.longest_prefix(empty.name))
+                   for empty in empty_objects]
+        matches = [(empty, match) for empty, match in matches if match]
+        if not matches:
+            return {'CANCELLED'}
+
+        failed_files = []
+        result = link_groups(context, [match for empty, match in matches],
+                             make_proxy=False, failed_files=failed_files)
+
+        count = 0
+        for (empty, match), (group, new_empty) in zip(matches, result):
+            if new_empty is None:
                 continue
 
             name_empty = empty.name
-            matrix_empty = empty.matrix_world
-
-            g, f = matching_groups[0]
-            bpy.ops.scene.oha_quicklink_makeproxy(group_name=g, file_path=f,
-                                                  make_proxy=False)
+            new_empty.matrix_world = empty.matrix_world.copy()
+            scene.objects.unlink(empty)
 
-            new_empty = context.active_object
-            new_empty.matrix_world = matrix_empty
             new_empty.name = name_empty
             new_empty.name = name_empty # Bump original object's name
+            count += 1
 
-            scene.objects.unlink(empty)
+        summary = "Reinstanced %d of %d empties" % (count, len(empty_objects))
+        if failed_files:
+            self.report({'WARNING'}, "%s, can't read %s"
+                        % (summary, ", ".join(failed_files)))
+        else:
+            self.report({'INFO'}, summary)
+        return {'FINISHED'}
+
+class SCENE_OT_oha_library_report(bpy.types.Operator):
+    """Check all library paths and instanced groups, suggesting relocated files from the QuickLink list."""
+    bl_idname = 'scene.oha_library_report'
+    bl_label = 'Library Health Report'
+    bl_options = {'REGISTER'}
+
+    workers = IntProperty(
+        name="Workers",
+        description="Number of threads checking library paths.",
+        default=16, min=1, max=128)
+
+    def execute(self, context):
+        props = context.scene.oha.quicklink_props
 
+        # Relative library paths come out as "/shots/../lib/x.blend",
+        # normalized to compare with the scanned paths. Paths of
+        # indirectly linked libraries are relative to their parent.
+        lib_paths = dict((lib, os.path.normpath(
+            bpy.path.abspath(lib.filepath, library=lib.parent)))
+                         for lib in bpy.data.libraries)
+        stats = stat_paths(lib_paths.values(), self.workers)
+
+        # QuickLink index, by group name and by file base name.
+        files_by_group = {}
+        files_by_basename = {}
+        groups_by_file = {}
+        for g, f in props.groups:
+            f = os.path.normpath(f)
+            files_by_group.setdefault(g, set()).add(f)
+            groups_by_file.setdefault(f, set()).add(g)
+        for f in props.groups.paths:
+            f = os.path.normpath(f)
+            files_by_basename.setdefault(os.path.basename(f), set()).add(f)
+
+        instanced = {}
+        for o in bpy.data.objects:
+            if o.dupli_group and o.dupli_group.library:
+                instanced.setdefault(o.dupli_group.library, set())\
+                    .add(o.dupli_group.name)
+
+        lines = []
+        missing_libs = 0
+        missing_groups = 0
+        for lib, path in sorted(lib_paths.items(), key=lambda i: i[1]):
+            groups = instanced.get(lib, set())
+            if stats.get(path) is not None:
+                # Only files scanned by QuickLink can be checked for
+                # their groups without opening them.
+                lost = groups - groups_by_file.get(path, groups)
+                for g in sorted(lost):
+                    missing_groups += 1
+                    lines.append("MISSING GROUP %s in %s" % (g, path))
+                    for f in sorted(files_by_group.get(g, ())):
+                        lines.append("    found in %s" % f)
+                continue
+
+            missing_libs += 1
+            lines.append("MISSING LIBRARY %s (%s)" % (lib.filepath, path))
+            candidates = set(files_by_basename.get(os.path.basename(path),
+                                                   ()))
+            for g in groups:
+                candidates |= files_by_group.get(g, set())
+            # Files holding more of the instanced groups come first.
+            ranked = sorted(candidates, key=lambda f:
+                            (-len(groups & groups_by_file.get(f, set())), f))
+            for f in ranked:
+                lines.append("    candidate %s (%d/%d groups)"
+                             % (f, len(groups & groups_by_file.get(f, set())),
+                                len(groups)))
+
+        orphans = [o for o in context.scene.objects
+                   if o.type == 'EMPTY' and o.dupli_group == None]
+        index = GroupPrefixIndex(props.groups)
+        for o in orphans:
+            match = index.longest_prefix(o.name)
+            if match:
+                lines.append("EMPTY %s may instance %s from %s"
+                             % (o.name, match[0], match[1]))
+
+        summary = "%d libraries, %d missing, %d missing groups" \
+            % (len(lib_paths), missing_libs, missing_groups)
+        text = bpy.data.texts.get("oha_library_report")
+        if text is None:
+            text = bpy.data.texts.new("oha_library_report")
+        text.from_string("\n".join([summary] + lines) + "\n")
+
+        self.report({'WARNING'} if missing_libs or missing_groups
+                    else {'INFO'}, summary)
         return {'FINISHED'}
-            
+
 
 # ======================================================================
 # =========================== User Interface ===========================
@@ -1107,103 +4895,75 @@ class SCENE_UL_oha_quicklink_groups(bpy.types.UIList):
     def draw_item(self, context, layout, data, item, icon,
                   active_data, active_propname, index):
         props = context.scene.oha.quicklink_props
-        layout.label(text="%s (%s)" % (item.name, os.path.basename(item.file_path)))
+        row = layout.row(align=True)
+        row.prop(item, "selected", text="")
+        text = "%s (%s)" % (item.name, os.path.basename(item.file_path))
+        icon_id = quicklink_preview_icon(item.file_path)\
+            if props.show_previews else 0
+        if icon_id:
+            row.label(text=text, icon_value=icon_id)
+        else:
+            row.label(text=text)
 
-class RENDER_MT_oha_qc_presets(bpy.types.Menu):
-    '''Presets for final render settings.'''
-    bl_label = "Render Presets"
-    bl_idname = "RENDER_MT_oha_qc_presets"
-    preset_subdir = "oha_render_qc"
-    preset_operator = "script.execute_preset"
-    
-    # Minimally modified from scripts/modules/bpy_types.py
+class OHA_PresetMenu:
+    preset_extensions = {'.py', '.json'}
+
+    # Minimally modified from scripts/modules/bpy_types.py, listing
+    # folders through list_preset_dir instead of on every draw. JSON
+    # presets are applied by render.oha_preset_apply, and hide .py
+    # presets of the same name they were converted from.
     def path_menu(self, searchpaths, operator,
                   props_default={}, filter_ext=None):
 
         layout = self.layout
         # hard coded to set the operators 'filepath' to the filename.
 
-        import os
-        import bpy.utils
-
-        layout = self.layout
-
         if not searchpaths:
             layout.label("* Missing Paths *")
 
         # collect paths
         files = []
         for directory in searchpaths:
+            listing = list_preset_dir(directory)
+            converted = set(os.path.splitext(f)[0] for f in listing
+                            if f.endswith('.json'))
             files.extend([(f, os.path.join(directory, f))
-                          for f in os.listdir(directory)
-                          if (not f.startswith("."))
-                          if ((filter_ext is None) or
-                              (filter_ext(os.path.splitext(f)[1])))
+                          for f in listing
+                          if os.path.splitext(f)[1] in self.preset_extensions
+                          if not (f.endswith('.py') and f[:-3] in converted)
                           ])
 
         files.sort()
 
         for f, filepath in files:
-            props = layout.operator(operator,
-                                    text=bpy.path.display_name(f),
-                                    translate=False)
+            props = layout.operator(
+                'render.oha_preset_apply' if f.endswith('.json')
+                else operator,
+                text=bpy.path.display_name(f),
+                translate=False)
 
-            for attr, value in props_default.items():
-                setattr(props, attr, value)
+            if not f.endswith('.json'):
+                for attr, value in (props_default or {}).items():
+                    setattr(props, attr, value)
 
             props.filepath = filepath
             props.menu_idname = self.bl_idname
 
     draw = bpy.types.Menu.draw_preset
-    # def draw(self, context):
-    #     bpy.types.Menu.draw_preset(self, context)
 
-class RENDER_MT_oha_preview_presets(bpy.types.Menu):
+class RENDER_MT_oha_qc_presets(OHA_PresetMenu, bpy.types.Menu):
+    '''Presets for final render settings.'''
+    bl_label = "Render Presets"
+    bl_idname = "RENDER_MT_oha_qc_presets"
+    preset_subdir = "oha_render_qc"
+    preset_operator = "script.execute_preset"
+
+class RENDER_MT_oha_preview_presets(OHA_PresetMenu, bpy.types.Menu):
     '''Presets for preview render settings.'''
     bl_label = "Preview Presets"
     bl_idname = "RENDER_MT_oha_preview_presets"
     preset_subdir = "oha_preview"
     preset_operator = "script.execute_preset"
-
-    # Minimally modified from scripts/modules/bpy_types.py
-    def path_menu(self, searchpaths, operator,
-                  props_default={}, filter_ext=None):
-
-        layout = self.layout
-        # hard coded to set the operators 'filepath' to the filename.
-
-        import os
-        import bpy.utils
-
-        layout = self.layout
-
-        if not searchpaths:
-            layout.label("* Missing Paths *")
-
-        # collect paths
-        files = []
-        for directory in searchpaths:
-            files.extend([(f, os.path.join(directory, f))
-                          for f in os.listdir(directory)
-                          if (not f.startswith("."))
-                          if ((filter_ext is None) or
-                              (filter_ext(os.path.splitext(f)[1])))
-                          ])
-
-        files.sort()
-
-        for f, filepath in files:
-            props = layout.operator(operator,
-                                    text=bpy.path.display_name(f),
-                                    translate=False)
-
-            for attr, value in props_default.items():
-                setattr(props, attr, value)
-
-            props.filepath = filepath
-            props.menu_idname = self.bl_idname
-
-    draw = bpy.types.Menu.draw_preset
         
 class RENDER_PT_oha_render_panel(bpy.types.Panel):
     bl_label = 'OHA Render Settings'
@@ -1227,12 +4987,21 @@ class RENDER_PT_oha_render_panel(bpy.types.Panel):
                  text=bpy.types.RENDER_MT_oha_preview_presets.bl_label)
         row.operator("render.oha_preview_preset_add", text="", icon='ZOOMIN')
         row.operator("render.oha_preview_preset_add", text="", icon='ZOOMOUT').remove_active = True
+        row = col.row(align=True)
+        row.operator("render.oha_preset_convert")
+        row.operator("render.oha_batch_apply_preset")
 
         box = layout.box()
         col = box.column_flow(align=True)
         col.label('Preview Settings:')
         col.prop(context.scene.oha.opengl_props.load, 'render_filepath')
         col.prop(context.scene.oha.opengl_props.load, 'render_stamp_note_text')
+        col.prop(context.scene.oha.opengl_props.load, 'shot_workers')
+        row = col.row(align=True)
+        row.prop(context.scene.oha.opengl_props.load, 'burn_in')
+        row.operator("render.oha_burn_in", text="", icon='FILE_REFRESH')
+        row.operator("render.oha_burn_in", text="",
+                     icon='MARKER_HLT').shots = True
 
 class GRAPH_PT_oha_animation_tools(bpy.types.Panel):
     bl_label = 'OHA Animation Tools'
@@ -1253,7 +5022,22 @@ class GRAPH_PT_oha_animation_tools(bpy.types.Panel):
                      text='')
 
         row = layout.row(align=True)
-        row.operator('graph.oha_fcurve_bake_action')
+        row.operator('graph.oha_check_cycle_seams').fix = False
+        row.operator('graph.oha_check_cycle_seams', icon='MODIFIER',
+                     text='').fix = True
+
+        row = layout.row(align=True)
+        row.operator('graph.oha_retime')
+        row.operator('graph.oha_clean_static_fcurves', text='Clean Static')
+
+        row = layout.row(align=True)
+        row.operator('graph.oha_fcurve_bake_action').mode = 'CYCLES'
+        row.operator('graph.oha_fcurve_bake_action',
+                     text='Flatten NLA').mode = 'NLA'
+
+        row = layout.row(align=True)
+        row.operator('graph.oha_pose_cache_export', text='Export Cache')
+        row.operator('graph.oha_pose_cache_import', text='Import Cache')
 
 class VIEW3D_PT_oha_animation_tools(bpy.types.Panel):
     bl_label = 'OHA Animation Tools'
@@ -1275,6 +5059,7 @@ class VIEW3D_PT_oha_animation_tools(bpy.types.Panel):
 
         col = layout.column(align=True)
         col.operator('object.oha_snap_to_object')
+        col.operator('pose.oha_visual_bake')
 
 class SEQUENCER_PT_oha_animation_tools(bpy.types.Panel):
     bl_label = 'OHA Animation Tools'
@@ -1290,6 +5075,8 @@ class SEQUENCER_PT_oha_animation_tools(bpy.types.Panel):
 
         col = layout.column(align=True)
         col.operator('sequencer.oha_grouped_movie_strip_add')
+        col.operator('sequencer.oha_conform_edit_list')
+        col.operator('sequencer.oha_build_proxies')
 
 class SCENE_PT_oha_quicklink(bpy.types.Panel):
     bl_label = 'OHA Quick Link'
@@ -1310,20 +5097,68 @@ class SCENE_PT_oha_quicklink(bpy.types.Panel):
         prop.use_cache = False
         col.prop(props, "list_filter", text="")
 
+        row = layout.row(align=True)
+        row.prop(props, "scan_depth", text="Depth")
+        row.prop(props, "include_patterns", text="")
+        row.prop(props, "exclude_patterns", text="")
+        row.prop(props, "show_previews", text="", icon='IMAGE_DATA')
+
         col = layout.row()
         row = col.column()
         row.template_list("SCENE_UL_oha_quicklink_groups", "", props,
                           "groups_collection",
                           props, "groups_index", rows=10)
+        if props.groups_matched > len(props.groups_collection):
+            sub = row.row(align=True)
+            sub.label("Showing %d of %d" % (len(props.groups_collection),
+                                            props.groups_matched))
+            sub.prop(props, "max_items", text="Max")
 
         row = col.column(align=True)
         row.operator("scene.oha_quicklink_makeproxy", icon='ZOOM_IN', text='')
         row.operator("scene.oha_quicklink_makeproxy", icon='VIEWZOOM', text='').make_instance = False
         row.operator("scene.oha_quicklink_makeproxy", icon='ZOOM_PREVIOUS', text='').make_proxy = False
 
+        row.separator()
+        row.operator("scene.oha_quicklink_select_all",
+                     icon='CHECKBOX_HLT', text='')
+        row.operator("scene.oha_quicklink_makeproxy_batch",
+                     icon='LINK_BLEND', text='')
+
         row.separator()
         row.operator("scene.oha_reinstance_missing_groups",
                      icon='MODIFIER', text='')
+        row.operator("scene.oha_library_report",
+                     icon='FILE_TICK', text='')
+
+class SCENE_PT_oha_profile(bpy.types.Panel):
+    bl_label = 'OHA Operator Timings'
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = 'scene'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(self, context):
+        prefs = addon_preferences()
+        return prefs != None and prefs.profile_operators
+
+    def draw(self, context):
+        layout = self.layout
+        history = list(profile_history)[-addon_preferences().profile_history:]
+
+        if not history:
+            layout.label("No operator runs recorded yet.")
+        col = layout.column(align=True)
+        for record in reversed(history):
+            counters = ", ".join("%s %d" % item for item
+                                 in sorted(record['counters'].items()))
+            row = col.row()
+            row.label(record['operator'])
+            row.label("%.1f ms" % (record['time'] * 1000))
+            if counters:
+                col.label("    " + counters)
+        layout.label("Log: " + os.path.join(profile_folder(), 'operators.log'))
 
 
 # ======================================================================
@@ -1336,20 +5171,96 @@ def view3d_header_renderpreview(self, context):
 
     row = layout.row(align=True)
     row.operator('render.oha_opengl', icon='RENDER_ANIMATION', text='Preview')
+    row.operator('render.oha_opengl', icon='MARKER_HLT', text='').shots = True
     row.operator('render.oha_opengl_settings', icon='DISK_DRIVE'
                  if props.restored else 'LOAD_FACTORY', text='')
 
+property_classes = (
+    OHA_AddonPreferences,
+    OHA_RenderOpenGL_Settings,
+    OHA_RenderOpenGL_Props,
+    OHA_QuickLink_BlendFile,
+    OHA_QuickLink_Props,
+    OHA_Props,
+    )
+
+operator_classes = (
+    RENDER_OT_oha_render_opengl_animation,
+    RENDER_OT_oha_render_opengl_animation_settings,
+    RENDER_OT_oha_burn_in,
+    RENDER_OT_oha_preset_apply,
+    RENDER_OT_oha_preset_convert,
+    RENDER_OT_oha_render_qc_preset_add,
+    RENDER_OT_oha_preview_preset_add,
+    RENDER_OT_oha_batch_apply_preset,
+    GRAPH_OT_oha_fcurve_bake_action,
+    GRAPH_OT_oha_fcurve_add_cycle_modifier,
+    GRAPH_OT_oha_fcurve_remove_cycle_modifier,
+    GRAPH_OT_oha_check_cycle_seams,
+    GRAPH_OT_oha_clean_static_fcurves,
+    GRAPH_OT_oha_retime,
+    GRAPH_OT_oha_pose_cache_export,
+    GRAPH_OT_oha_pose_cache_import,
+    VIEW3D_OT_oha_object_snap_to_prev_keyframe,
+    VIEW3D_OT_oha_pose_visual_bake,
+    VIEW3D_OT_oha_object_snap_to_object,
+    SEQUENCER_OT_oha_movie_strip_add,
+    SEQUENCER_OT_oha_conform_edit_list,
+    SEQUENCER_OT_oha_build_proxies,
+    SCENE_OT_oha_quicklink_populate,
+    SCENE_OT_oha_quicklink_makeproxy,
+    SCENE_OT_oha_quicklink_makeproxy_batch,
+    SCENE_OT_oha_quicklink_select_all,
+    SCENE_OT_oha_reinstance_missing_groups,
+    SCENE_OT_oha_library_report,
+    )
+
+# Not registered in background mode, where nothing is drawn.
+ui_classes = (
+    SCENE_UL_oha_quicklink_groups,
+    RENDER_MT_oha_qc_presets,
+    RENDER_MT_oha_preview_presets,
+    RENDER_PT_oha_render_panel,
+    GRAPH_PT_oha_animation_tools,
+    VIEW3D_PT_oha_animation_tools,
+    SEQUENCER_PT_oha_animation_tools,
+    SCENE_PT_oha_quicklink,
+    SCENE_PT_oha_profile,
+    )
+
+def registered_classes():
+    if bpy.app.background:
+        return property_classes + operator_classes
+    return property_classes + operator_classes + ui_classes
+
 def register():
-    bpy.utils.register_module(__name__)
-    bpy.types.VIEW3D_HT_header.append(view3d_header_renderpreview)
+    for cls in registered_classes():
+        bpy.utils.register_class(cls)
+    prefs = addon_preferences()
+    profile_operators_set(prefs != None and prefs.profile_operators)
     bpy.types.Scene.oha = PointerProperty(
         type = OHA_Props,
         options = {'HIDDEN', 'SKIP_SAVE'})
+    for name, handler in library_mirror_handlers:
+        getattr(bpy.app.handlers, name).append(handler)
+    if not bpy.app.background:
+        bpy.types.VIEW3D_HT_header.append(view3d_header_renderpreview)
 
 def unregister():
-    bpy.utils.unregister_module(__name__)
-    bpy.types.VIEW3D_HT_header.remove(view3d_header_renderpreview)
-    del bpy.types.Scene.oha_props
+    global library_mirror
+
+    quicklink_previews_clear()
+    for name, handler in library_mirror_handlers:
+        getattr(bpy.app.handlers, name).remove(handler)
+    if library_mirror != None:
+        library_mirror.stop()
+        library_mirror = None
+    if not bpy.app.background:
+        bpy.types.VIEW3D_HT_header.remove(view3d_header_renderpreview)
+    del bpy.types.Scene.oha
+    profile_operators_set(False)
+    for cls in reversed(registered_classes()):
+        bpy.utils.unregister_class(cls)
 
 if __name__ == "__main__":
     register()
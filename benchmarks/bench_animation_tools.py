@@ -0,0 +1,290 @@
+# Author: Adhi Hargo (cadmus.sw@gmail.com)
+# License: GPL v2
+#
+# Benchmarks for the addon's hot paths, run in headless Blender:
+#
+#   blender --background --factory-startup \
+#       --python benchmarks/bench_animation_tools.py -- \
+#       --output results.json [--baseline baseline.json]
+#
+# Synthetic data (armature with cycled f-curves, library .blend files
+# with groups, optional ffmpeg-generated movies) is built in a
+# temporary folder. Results are written as JSON; with --baseline each
+# benchmark is compared to a stored result, and the exit code is 1 if
+# any got slower than --tolerance times its baseline.
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(
+        prog="bench_animation_tools.py",
+        description="Time the OHA Animation Tools hot paths.")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help="Allowed slowdown factor against the baseline.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--bones', type=int, default=100)
+    parser.add_argument('--fcurves', type=int, default=10,
+                        help="Cycled f-curves per bone.")
+    parser.add_argument('--keys', type=int, default=24,
+                        help="Keyframes per f-curve.")
+    parser.add_argument('--files', type=int, default=20,
+                        help="Library .blend files.")
+    parser.add_argument('--groups', type=int, default=20,
+                        help="Groups per library file.")
+    parser.add_argument('--movies', type=int, default=10,
+                        help="Movies to probe, skipped without ffmpeg.")
+    return parser.parse_args(argv)
+
+
+# ----------------------------------------------------------------------
+# Synthetic data
+# ----------------------------------------------------------------------
+
+CHANNELS = [('location', 3), ('rotation_quaternion', 4), ('scale', 3)]
+
+def make_armature(scene, bones, fcurves, keys):
+    arm = bpy.data.armatures.new("bench_rig")
+    obj = bpy.data.objects.new("bench_rig", arm)
+    scene.objects.link(obj)
+    scene.objects.active = obj
+
+    bpy.ops.object.mode_set(mode='EDIT')
+    for i in range(bones):
+        bone = arm.edit_bones.new("bone_%03d" % i)
+        bone.head = (i * 0.1, 0, 0)
+        bone.tail = (i * 0.1, 0, 1)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    obj.animation_data_create()
+    action = bpy.data.actions.new("bench_action")
+    obj.animation_data.action = action
+
+    channels = [(path, index) for path, size in CHANNELS
+                for index in range(size)][:fcurves]
+    for i in range(bones):
+        name = "bone_%03d" % i
+        for path, index in channels:
+            fcurve = action.fcurves.new('pose.bones["%s"].%s' % (name, path),
+                                        index, name)
+            fcurve.keyframe_points.add(keys)
+            co = []
+            for k in range(keys):
+                co.extend((k * 2 + 1, (k % 5) * 0.1 + i * 0.01))
+            fcurve.keyframe_points.foreach_set('co', co)
+            fcurve.modifiers.new(type='CYCLES')
+            fcurve.update()
+
+    for bone in arm.bones:
+        bone.select = True
+    return obj
+
+def make_libraries(folder, files, groups):
+    # One subfolder level, as QuickLink scans by default.
+    for f in range(files):
+        subfolder = os.path.join(folder, "set_%02d" % (f % 4))
+        os.makedirs(subfolder, exist_ok=True)
+        datablocks = set()
+        for g in range(groups):
+            group = bpy.data.groups.new("asset_%03d_%03d" % (f, g))
+            empty = bpy.data.objects.new(group.name + "_root", None)
+            group.objects.link(empty)
+            datablocks.add(group)
+        bpy.data.libraries.write(os.path.join(subfolder, "lib_%03d.blend" % f),
+                                 datablocks)
+        for group in datablocks:
+            for o in list(group.objects):
+                bpy.data.objects.remove(o, do_unlink=True)
+            bpy.data.groups.remove(group)
+
+def make_movies(folder, movies):
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None or not movies:
+        return []
+    paths = []
+    for i in range(movies):
+        path = os.path.join(folder, "movie_%03d.mov" % i)
+        subprocess.check_call(
+            [ffmpeg, '-y', '-v', 'error', '-f', 'lavfi',
+             '-i', 'testsrc=duration=2:size=320x240:rate=24',
+             '-f', 'lavfi', '-i', 'sine=duration=2', '-shortest', path])
+        paths.append(path)
+    return paths
+
+
+# ----------------------------------------------------------------------
+# Benchmarks, each a (name, setup, run) triple. setup() runs untimed
+# before every run(state).
+# ----------------------------------------------------------------------
+
+def benchmarks(oha, args, scene, folder):
+    def rig_setup():
+        for o in list(bpy.data.objects):
+            if o.name.startswith("bench_rig"):
+                bpy.data.objects.remove(o, do_unlink=True)
+        for a in list(bpy.data.actions):
+            bpy.data.actions.remove(a)
+        return make_armature(scene, args.bones, args.fcurves, args.keys)
+
+    def bake(obj):
+        oha.bake_action(obj, 1, 250, only_selected=True, only_visible=False)
+
+    def add_cycles(obj):
+        bpy.ops.graph.oha_fcurve_add_cycle_modifier(
+            mode_before='REPEAT', mode_after='REPEAT', only_selected=False)
+
+    def remove_cycles(obj):
+        bpy.ops.graph.oha_fcurve_remove_cycle_modifier(only_selected=False)
+
+    def snap_setup():
+        for o in list(scene.objects):
+            o.select = False
+        target = bpy.data.objects.get("bench_target")\
+            or bpy.data.objects.new("bench_target", None)
+        active = bpy.data.objects.get("bench_active")\
+            or bpy.data.objects.new("bench_active", None)
+        for o in (target, active):
+            if o.name not in scene.objects:
+                scene.objects.link(o)
+            o.select = True
+        target.location = (1, 2, 3)
+        scene.objects.active = active
+        return active
+
+    def snap(active):
+        for i in range(100):
+            bpy.ops.object.oha_snap_to_object()
+
+    library_folder = os.path.join(folder, "library")
+    make_libraries(library_folder, args.files, args.groups)
+    props = scene.oha.quicklink_props
+
+    def quicklink_scan(state):
+        files = oha.scan_files(library_folder, 2, min_depth=1)
+        groups = oha.GroupTable()
+        for f in files:
+            with bpy.data.libraries.load(f) as (data_from, data_to):
+                for g in data_from.groups:
+                    groups.append(g, f)
+        props.groups.replace(groups)
+
+    def quicklink_filter(state):
+        # Item assignment skips the property update callbacks.
+        props['root_folder'] = library_folder
+        for text in ("asset_00", "asset", "lib_01", ""):
+            props['list_filter'] = text
+            bpy.ops.scene.oha_quicklink_populate()
+
+    qc = oha.RENDER_OT_oha_render_qc_preset_add
+    scene.render.resolution_percentage = 50
+    preset_a = oha.read_preset_values(qc.preset_defines, qc.preset_values)
+    scene.render.resolution_percentage = 100
+    scene.render.use_stamp = not scene.render.use_stamp
+    preset_b = oha.read_preset_values(qc.preset_defines, qc.preset_values)
+    preset_paths = [os.path.join(folder, "preset_a.json"),
+                    os.path.join(folder, "preset_b.json")]
+    oha.write_preset(preset_paths[0], preset_a)
+    oha.write_preset(preset_paths[1], preset_b)
+
+    def preset_apply(state):
+        for i in range(50):
+            oha.apply_preset(oha.load_preset(preset_paths[i % 2]))
+
+    result = [
+        ("bake_action", rig_setup, bake),
+        ("add_cycle_modifier", rig_setup, add_cycles),
+        ("remove_cycle_modifier", rig_setup, remove_cycles),
+        ("snap_to_object_x100", snap_setup, snap),
+        ("quicklink_scan", lambda: None, quicklink_scan),
+        ("quicklink_filter", lambda: None, quicklink_filter),
+        ("preset_apply_x50", lambda: None, preset_apply),
+        ]
+
+    movies = make_movies(folder, args.movies)
+    if movies:
+        result.append(("probe_movies", lambda: None,
+                       lambda state: oha.probe_movies(movies)))
+    return result
+
+
+def run(args):
+    folder = tempfile.mkdtemp(prefix="oha_bench_")
+    results = {}
+    try:
+        start = time.perf_counter()
+        import animation_tools as oha
+        oha.register()
+        results['register'] = dict(runs=[time.perf_counter() - start])
+        print("%-24s %8.4fs" % ('register', results['register']['runs'][0]))
+
+        scene = bpy.context.scene
+        for name, setup, bench in benchmarks(oha, args, scene, folder):
+            runs = []
+            for i in range(args.repeat):
+                state = setup()
+                start = time.perf_counter()
+                bench(state)
+                runs.append(time.perf_counter() - start)
+            results[name] = dict(runs=runs)
+            print("%-24s min %8.4fs  median %8.4fs"
+                  % (name, min(runs), statistics.median(runs)))
+
+        oha.unregister()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    for r in results.values():
+        r['min'] = min(r['runs'])
+        r['median'] = statistics.median(r['runs'])
+    return results
+
+
+def compare(results, baseline, tolerance):
+    slower = []
+    for name, r in sorted(results.items()):
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = r['min'] / base['min'] if base['min'] else 1.0
+        print("%-24s %6.2fx baseline" % (name, ratio))
+        if ratio > tolerance:
+            slower.append(name)
+    return slower
+
+
+def main():
+    args = parse_args()
+    results = run(args)
+
+    report = dict(blender=bpy.app.version_string,
+                  params=dict((k, v) for k, v in vars(args).items()
+                              if k not in ('output', 'baseline')),
+                  results=results)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            print("Slower than baseline: %s" % ", ".join(slower))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Author: Adhi Hargo (cadmus.sw@gmail.com)
+# License: GPL v2
+#
+# Edit list parsing tests, run in headless Blender:
+#
+#   blender --background --factory-startup \
+#       --python tests/test_edit_lists.py
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import animation_tools as oha
+
+EDL = """TITLE: TEST
+FCM: NON-DROP FRAME
+
+001  CLIP_A   V     C        01:00:00:00 01:00:01:00 00:00:00:00 00:00:01:00
+* FROM CLIP NAME: a.mov
+
+002  CLIP_A   A     C        01:00:00:00 01:00:01:00 00:00:00:00 00:00:01:00
+* FROM CLIP NAME: a.mov
+
+003  CLIP_B   V     C        02:00:00:12 02:00:01:00 00:00:01:00 00:00:01:12
+* FROM CLIP NAME: b.mov
+
+004  CLIP_C   B     C        00:00:10:00 00:00:11:00 00:00:01:12 00:00:02:12
+* FROM CLIP NAME: c.mov
+"""
+
+
+class ParseEdlTest(unittest.TestCase):
+    def parse(self, text, fps=24):
+        fd, filepath = tempfile.mkstemp(suffix='.edl')
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        try:
+            return oha.parse_edl(filepath, fps)
+        finally:
+            os.remove(filepath)
+
+    def test_video_events(self):
+        events = self.parse(EDL)
+        self.assertEqual([e['file'] for e in events],
+                         ['a.mov', 'b.mov', 'c.mov'])
+
+    def test_audio_and_video_event(self):
+        event = self.parse(EDL)[-1]
+        self.assertEqual(event['file'], 'c.mov')
+        self.assertEqual(event['source_in'], 10 * 24)
+        self.assertEqual(event['source_out'], 11 * 24)
+        self.assertEqual(event['record_in'], 36)
+        self.assertTrue(event['timecode'])
+
+
+if __name__ == '__main__':
+    result = unittest.main(argv=[sys.argv[0]], exit=False).result
+    sys.exit(0 if result.wasSuccessful() else 1)